@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+COMMANDS = {
+    "--help": "from glo4002_e2e_tester.tester import main; main(['--help'], standalone_mode=False)",
+    "--list-stories": "from glo4002_e2e_tester.tester import main; main(['--list-stories'], standalone_mode=False)",
+}
+FORBIDDEN_MODULES = ("httpx", "httpcore", "rich")
+SOURCE_DIR = Path(__file__).resolve().parent.parent / "src"
+
+
+def import_time(code: str) -> tuple[float, set[str]]:
+    env = dict(
+        os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(SOURCE_DIR), os.environ.get("PYTHONPATH")]))
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True, env=env
+    )
+    total = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, _, module = line[len("import time:") :].split("|")
+        total += int(self_time)
+        modules.add(module.strip())
+    return total / 1_000_000, modules
+
+
+def measure(code: str, runs: int) -> tuple[float, set[str]]:
+    baseline = statistics.median(import_time("pass")[0] for _ in range(runs))
+    samples = [import_time(code) for _ in range(runs)]
+    return statistics.median(sample[0] for sample in samples) - baseline, samples[0][1]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fail when the CLI metadata commands import too much")
+    parser.add_argument("--budget", type=float, default=100.0, help="Import time budget in ms per command")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per command, the median is kept")
+    args = parser.parse_args()
+
+    failed = False
+    for command, code in COMMANDS.items():
+        elapsed, modules = measure(code, args.runs)
+        forbidden = sorted(module for module in modules if module.partition(".")[0] in FORBIDDEN_MODULES)
+        status = "OK" if elapsed * 1000 <= args.budget and not forbidden else "FAIL"
+        failed |= status == "FAIL"
+        print(f"{status:<4} {command:<15} {elapsed * 1000:7.1f} ms (budget {args.budget:.0f} ms)")
+        if forbidden:
+            print(f"     imports {', '.join(forbidden)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
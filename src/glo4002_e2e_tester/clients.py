@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from httpx import AsyncClient, Client
+
+DEFAULT_TARGET = "http://localhost:8181"
+INPROC_TARGET = "inproc"
+DEFAULT_TIMEOUT = 5.0
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 5.0
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+@dataclass(frozen=True)
+class ClientConfig:
+    target: str = DEFAULT_TARGET
+    max_connections: int | None = None
+    max_keepalive_connections: int | None = None
+    keepalive_expiry: float | None = None
+    http2: bool = False
+    connect_timeout: float | None = None
+    read_timeout: float | None = None
+
+    def options(self, max_connections: int | None = None) -> dict[str, Any]:
+        from httpx import Limits, Timeout
+
+        return {
+            "limits": Limits(
+                max_connections=self.max_connections or max(DEFAULT_MAX_CONNECTIONS, max_connections or 0),
+                max_keepalive_connections=(
+                    self.max_keepalive_connections
+                    if self.max_keepalive_connections is not None
+                    else max(DEFAULT_MAX_KEEPALIVE_CONNECTIONS, max_connections or 0)
+                ),
+                keepalive_expiry=(
+                    self.keepalive_expiry if self.keepalive_expiry is not None else DEFAULT_KEEPALIVE_EXPIRY
+                ),
+            ),
+            "timeout": Timeout(
+                DEFAULT_TIMEOUT,
+                connect=self.connect_timeout if self.connect_timeout is not None else DEFAULT_TIMEOUT,
+                read=self.read_timeout if self.read_timeout is not None else DEFAULT_TIMEOUT,
+            ),
+            "http2": self.http2,
+        }
+
+
+_config = ClientConfig()
+_default_client: Client | None = None
+
+
+def configure_clients(config: ClientConfig) -> None:
+    global _config, _default_client
+    if config.http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            raise RuntimeError(
+                "HTTP/2 requires the 'h2' package, install glo4002-e2e-tester[http2]"
+            ) from None
+    _config = config
+    if _default_client is not None:
+        _default_client.close()
+        _default_client = None
+
+
+def client_config() -> ClientConfig:
+    return _config
+
+
+def get_client() -> Client:
+    global _default_client
+    if _default_client is None:
+        _default_client = open_client(_config.target)
+    return _default_client
+
+
+def open_client(target: str, max_connections: int | None = None) -> Client:
+    from httpx import URL, Client
+
+    options = _config.options(max_connections)
+    if target == INPROC_TARGET:
+        from httpx import WSGITransport
+
+        from .inproc import INPROC_BASE_URL, InProcessPark
+
+        return Client(
+            headers=JSON_HEADERS,
+            base_url=URL(url=INPROC_BASE_URL),
+            transport=WSGITransport(app=InProcessPark().wsgi),
+            timeout=options["timeout"],
+        )
+    return Client(headers=JSON_HEADERS, base_url=URL(url=target), **options)
+
+
+def open_async_client(target: str, max_connections: int | None = None) -> AsyncClient:
+    from httpx import URL, AsyncClient
+
+    options = _config.options(max_connections)
+    if target == INPROC_TARGET:
+        from httpx import ASGITransport
+
+        from .inproc import INPROC_BASE_URL, InProcessPark
+
+        return AsyncClient(
+            headers=JSON_HEADERS,
+            base_url=URL(url=INPROC_BASE_URL),
+            transport=ASGITransport(app=InProcessPark().asgi),
+            timeout=options["timeout"],
+        )
+    return AsyncClient(headers=JSON_HEADERS, base_url=URL(url=target), **options)
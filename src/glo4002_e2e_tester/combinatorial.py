@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import random
+from collections.abc import Iterator
+from dataclasses import dataclass
+from itertools import count as count_from
+from itertools import product
+
+from .models import (
+    DinoCarnivore,
+    DinoGender,
+    DinoHerbivorous,
+    Dinosaurs,
+    DinoSpecies,
+    PostResourcesRequest,
+)
+from .resources import (
+    Status,
+    get_dinosaur_by_name,
+    get_dinosaurs,
+    get_resources,
+    post_dinosaurs,
+    post_reset,
+    post_resources,
+    post_turn,
+)
+from .simulator import BURGER_LIFETIME, ParkSimulator
+from .tests import TestStory, register_test_story_builder
+
+# Both sides of the salad (400) and burger (1000) portion steps, then a starving giant
+BOUNDARY_WEIGHTS = (1, 399, 400, 401, 999, 1000, 1001, 10000)
+INVALID_WEIGHTS = (-1, 0)
+MAX_STEPS = 12
+MAX_ORDER = 300
+DUPLICATE_RATE = 0.1
+NEGATIVE_ORDER_RATE = 0.1
+FEAST_RATE = 0.25
+# Small enough for the feast's dinosaurs to drink less than a turn's water once they are no longer newcomers
+MAX_FEAST_FOOD = 10
+
+_ACTIONS = ("turn", "order", "companion", "check")
+_ACTION_WEIGHTS = (4, 3, 2, 1)
+_VALID_GENDERS = [gender for gender in DinoGender if gender != DinoGender.INVALID]
+_VALID_SPECIES = [species for species in DinoSpecies if species != DinoSpecies.INVALID]
+_CARNIVORES = [species for species in DinoSpecies if species in DinoCarnivore]
+_HERBIVORES = [species for species in DinoSpecies if species in DinoHerbivorous]
+
+
+@dataclass(frozen=True)
+class Combination:
+    species: DinoSpecies
+    gender: DinoGender
+    weight: int
+
+    def label(self) -> str:
+        return f"{self.species.value.lower().replace(' ', '_')}_{self.gender.value.lower()}_w{self.weight}"
+
+
+def combination_matrix() -> list[Combination]:
+    """Every valid species, gender and boundary weight, then each invalid value with otherwise valid attributes.
+
+    A single invalid attribute per dinosaur, so the expected error never depends on the order a server checks them.
+    """
+    return [
+        Combination(species, gender, weight)
+        for species_choices, gender_choices, weights in (
+            (_VALID_SPECIES, _VALID_GENDERS, BOUNDARY_WEIGHTS),
+            (_VALID_SPECIES, _VALID_GENDERS, INVALID_WEIGHTS),
+            (_VALID_SPECIES, [DinoGender.INVALID], BOUNDARY_WEIGHTS),
+            ([DinoSpecies.INVALID], _VALID_GENDERS, BOUNDARY_WEIGHTS),
+        )
+        for species, gender, weight in product(species_choices, gender_choices, weights)
+    ]
+
+
+def generated_story_name(seed: int, index: int, combination: Combination) -> str:
+    return f"gen{seed}_{index:05d}_{combination.label()}"
+
+
+def _post_dinosaur(park: ParkSimulator, dinosaur: Dinosaurs) -> None:
+    error = park.add_dinosaur(dinosaur)
+    post_dinosaurs(dinosaur, error, Status.OK if error is None else Status.BAD_REQUEST)
+
+
+def _post_order(park: ParkSimulator, rng: random.Random) -> None:
+    quantities = [
+        -rng.randint(1, MAX_ORDER) if draw < NEGATIVE_ORDER_RATE else rng.randint(0, MAX_ORDER)
+        for draw in (rng.random() for _ in range(3))
+    ]
+    if not any(quantities):
+        quantities[rng.randrange(3)] = rng.randint(1, MAX_ORDER)
+    order = PostResourcesRequest(*quantities)
+    error = park.add_resources(order)
+    post_resources(order, error, Status.OK if error is None else Status.BAD_REQUEST)
+
+
+def _check_park(park: ParkSimulator) -> None:
+    get_resources(expected_response=park.resources())
+    get_dinosaurs(expected_response=park.dinosaurs())
+
+
+def _feast(park: ParkSimulator, rng: random.Random, index: int) -> None:
+    """Partly eats the first turn's batches, then plays until they expire.
+
+    The carnivore empties the ordered burgers and bites into the park's production, the herbivore only bites into the
+    ordered salads, and both newcomers eat twice their need.
+    """
+    burgers = rng.randint(1, 2 * MAX_FEAST_FOOD - 2)
+    food = rng.randint(burgers // 2 + 1, MAX_FEAST_FOOD)
+    grass = rng.randint(1, MAX_FEAST_FOOD)
+    salads = rng.randint(2 * grass + 1, 2 * grass + MAX_ORDER)
+    glutton = Dinosaurs(f"Glutton{index}", food * 1000, rng.choice(_VALID_GENDERS), rng.choice(_CARNIVORES))
+    grazer = Dinosaurs(f"Grazer{index}", grass * 400, rng.choice(_VALID_GENDERS), rng.choice(_HERBIVORES))
+    order = PostResourcesRequest(burgers, salads, 2 * (food * 600 + grass * 240))
+    park.add_resources(order)
+    post_resources(order)
+    _post_dinosaur(park, glutton)
+    _post_dinosaur(park, grazer)
+    for _ in range(BURGER_LIFETIME + 2):
+        post_turn(expected_response=park.turn())
+        _check_park(park)
+
+
+def play_generated_story(seed: int, index: int, combination: Combination) -> None:
+    """Posts the combination's dinosaur among seeded turns, orders and companions, checked against the simulator."""
+    rng = random.Random(f"{seed}:{index}")
+    park = ParkSimulator()
+    subject = Dinosaurs(f"Subject{index}", combination.weight, combination.gender, combination.species)
+    steps = rng.randint(1, MAX_STEPS)
+    subject_step = rng.randrange(steps)
+    companions = 0
+    post_reset()
+    # Its own generator, to keep the other steps of a seed's stories
+    feast = random.Random(f"{seed}:{index}:feast")
+    if feast.random() < FEAST_RATE:
+        _feast(park, feast, index)
+    for step in range(steps):
+        if step == subject_step:
+            _post_dinosaur(park, subject)
+        action = rng.choices(_ACTIONS, _ACTION_WEIGHTS)[0]
+        if action == "turn":
+            post_turn(expected_response=park.turn())
+        elif action == "order":
+            _post_order(park, rng)
+        elif action == "companion":
+            name = subject.name if rng.random() < DUPLICATE_RATE else f"Companion{index}_{companions}"
+            companions += 1
+            _post_dinosaur(
+                park,
+                Dinosaurs(name, rng.randint(1, 5000), rng.choice(_VALID_GENDERS), rng.choice(_VALID_SPECIES)),
+            )
+        else:
+            _check_park(park)
+    post_turn(expected_response=park.turn())
+    expected = park.dinosaur(subject.name)
+    get_dinosaur_by_name(
+        subject.name, expected, Status.OK if isinstance(expected, Dinosaurs) else Status.NOT_FOUND
+    )
+    _check_park(park)
+
+
+def _generated_story(seed: int, index: int, combination: Combination) -> TestStory:
+    def test_story() -> None:
+        play_generated_story(seed, index, combination)
+
+    test_story.__name__ = test_story.__qualname__ = generated_story_name(seed, index, combination)
+    return test_story
+
+
+def generate_test_stories(seed: int = 0, count: int | None = None) -> Iterator[TestStory]:
+    """Yields stories cycling through the matrix, each only keeping its combination until it runs."""
+    matrix = combination_matrix()
+    for index in count_from() if count is None else range(count):
+        yield _generated_story(seed, index, matrix[index % len(matrix)])
+
+
+def register_generated_stories(seed: int, count: int) -> None:
+    for test_story in generate_test_stories(seed, count):
+        register_test_story_builder(test_story, unique=True)
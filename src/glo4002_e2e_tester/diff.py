@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from collections.abc import Iterator, Mapping, Sequence
+from itertools import islice
+from reprlib import Repr
+from typing import Any
+
+MAX_DIFFERENCES = 20
+
+_repr = Repr()
+_repr.maxstring = 60
+_repr.maxother = 60
+_repr.maxlist = 4
+_repr.maxdict = 4
+_repr.maxlevel = 2
+
+
+def describe(value: Any) -> str:
+    return _repr.repr(value)
+
+
+def _join(path: str, key: Any) -> str:
+    if isinstance(key, int):
+        return f"{path}[{key}]"
+    return f"{path}.{key}" if path else str(key)
+
+
+def iter_differences(expected: Any, received: Any, path: str = "") -> Iterator[str]:
+    """Yields one line per differing path, walking both payloads once and lazily."""
+    if isinstance(expected, Mapping) and isinstance(received, Mapping):
+        for key, value in expected.items():
+            if key not in received:
+                yield f"{_join(path, key)}: missing, expected {describe(value)}"
+            else:
+                yield from iter_differences(value, received[key], _join(path, key))
+        for key, value in received.items():
+            if key not in expected:
+                yield f"{_join(path, key)}: unexpected {describe(value)}"
+    elif _is_array(expected) and _is_array(received):
+        if len(expected) != len(received):
+            yield f"{path or '<root>'}: length {len(expected)} != {len(received)}"
+        for index, (expected_item, received_item) in enumerate(zip(expected, received)):
+            yield from iter_differences(expected_item, received_item, _join(path, index))
+        if len(expected) != len(received):
+            for index in range(len(received), len(expected)):
+                yield f"{_join(path, index)}: missing, expected {describe(expected[index])}"
+            for index in range(len(expected), len(received)):
+                yield f"{_join(path, index)}: unexpected {describe(received[index])}"
+    elif type(expected) is not type(received) and not (_is_number(expected) and _is_number(received)):
+        yield f"{path or '<root>'}: expected {describe(expected)}, received {describe(received)}"
+    elif expected != received:
+        yield f"{path or '<root>'}: {describe(expected)} != {describe(received)}"
+
+
+def _is_array(value: Any) -> bool:
+    return isinstance(value, Sequence) and not isinstance(value, (str, bytes))
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def render_diff(
+    title: str, expected: Any, received: Any, limit: int = MAX_DIFFERENCES, path: str = ""
+) -> str:
+    lines = list(islice(iter_differences(expected, received, path), limit + 1))
+    if len(lines) > limit:
+        lines[limit:] = [f"... stopped after {limit} differences"]
+    return "\n".join([title, *(f"  {line}" for line in lines)])
@@ -0,0 +1,377 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+from collections.abc import Mapping, Sequence
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+from time import perf_counter, sleep
+from typing import Any
+
+from rich import print
+from rich.table import Table
+
+from .clients import ClientConfig, client_config, configure_clients
+from .load import DEFAULT_REPORT_INTERVAL, LoadReport, run_load
+from .resources import clear_request_observers, set_time_budgets, time_budgets
+from .sharding import restore_test_stories
+from .tests import clear_story_observers, registered_test_stories
+
+DEFAULT_WAIT = 60.0
+
+
+class CoordinationError(RuntimeError):
+    pass
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Expected host:port, got '{address}'")
+    return host.strip("[]"), int(port)
+
+
+@dataclass(frozen=True)
+class Assignment:
+    targets: list[str]
+    users: int
+    stories: list[str] = field(default_factory=list)
+    mix: dict[str, int] | None = None
+    duration: float | None = None
+    iterations: int | None = None
+    seed: int = 0
+    report_interval: float = DEFAULT_REPORT_INTERVAL
+
+
+def split_assignment(assignment: Assignment, workers: int) -> list[Assignment]:
+    """Virtual users spread evenly, with the seeds and targets they would have in a single `load` run."""
+    if assignment.users < workers:
+        raise ValueError(f"{assignment.users} virtual users cannot keep {workers} workers busy")
+    base, extra = divmod(assignment.users, workers)
+    assignments = []
+    first_user = 0
+    for worker in range(workers):
+        users = base + (worker < extra)
+        shift = first_user % len(assignment.targets)
+        targets = assignment.targets[shift:] + assignment.targets[:shift]
+        assignments.append(
+            replace(assignment, users=users, seed=assignment.seed + first_user, targets=targets)
+        )
+        first_user += users
+    return assignments
+
+
+class _Channel:
+    """Newline delimited JSON messages over a TCP connection."""
+
+    def __init__(self, connection: socket.socket) -> None:
+        self.connection = connection
+        self._file = connection.makefile("rwb")
+        self._lock = threading.Lock()
+
+    def send(self, message: Mapping[str, Any]) -> None:
+        line = json.dumps(message, separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def receive(self) -> dict[str, Any] | None:
+        line = self._file.readline()
+        return json.loads(line) if line else None
+
+    def close(self) -> None:
+        self._file.close()
+        self.connection.close()
+
+
+class _DeltaStream:
+    """Merges the virtual users' report deltas and sends them to the coordinator at most once per interval."""
+
+    def __init__(self, channel: _Channel, interval: float) -> None:
+        self.channel = channel
+        self.interval = interval
+        self._pending = LoadReport()
+        self._sent_at = perf_counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, delta: LoadReport) -> None:
+        with self._lock:
+            self._pending.merge(delta)
+            if perf_counter() - self._sent_at >= self.interval:
+                self._send()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._send()
+
+    def _send(self) -> None:
+        if self._pending.histograms or self._pending.outcomes:
+            self.channel.send({"type": "report", "report": self._pending.to_dict()})
+            self._pending = LoadReport()
+        self._sent_at = perf_counter()
+
+
+def _connect(address: tuple[str, int], wait: float) -> socket.socket:
+    deadline = perf_counter() + wait
+    while True:
+        try:
+            return socket.create_connection(address, timeout=wait)
+        except OSError:
+            if perf_counter() >= deadline:
+                raise CoordinationError(
+                    f"No coordinator on {address[0]}:{address[1]} after {wait:g}s"
+                ) from None
+            sleep(0.2)
+
+
+def run_worker(address: tuple[str, int], wait: float = DEFAULT_WAIT) -> None:
+    connection = _connect(address, wait)
+    connection.settimeout(None)
+    channel = _Channel(connection)
+    try:
+        channel.send(
+            {
+                "type": "hello",
+                "worker": f"{socket.gethostname()}:{os.getpid()}",
+                "stories": [test_story.__name__ for test_story in registered_test_stories()],
+            }
+        )
+        message = channel.receive()
+        if message is None or message["type"] != "assign":
+            raise CoordinationError((message or {}).get("message", "Coordinator closed the connection"))
+        assignment = Assignment(**message["assignment"])
+        print(f"Assigned {assignment.users} virtual users on {', '.join(assignment.targets)}")
+        stories = {test_story.__name__: test_story for test_story in registered_test_stories()}
+        deltas = _DeltaStream(channel, assignment.report_interval)
+        try:
+            report = asyncio.run(
+                run_load(
+                    targets=assignment.targets,
+                    users=assignment.users,
+                    stories=[stories[name] for name in assignment.stories],
+                    mix=assignment.mix,
+                    duration=assignment.duration,
+                    iterations=assignment.iterations,
+                    seed=assignment.seed,
+                    on_report=deltas,
+                    report_interval=assignment.report_interval,
+                )
+            )
+        except Exception as err:
+            deltas.flush()
+            channel.send({"type": "error", "message": f"{type(err).__name__}: {err}"})
+            raise
+        deltas.flush()
+        channel.send({"type": "done", "elapsed": report.elapsed})
+    finally:
+        channel.close()
+
+
+def _start_local_worker(
+    address: tuple[str, int],
+    config: ClientConfig,
+    story_files: Sequence[Path],
+    generated: tuple[int, int],
+    story_count: int,
+    budgets: tuple[float | None, float | None],
+    wait: float,
+) -> None:
+    restore_test_stories(story_files, generated, story_count)
+    configure_clients(config)
+    set_time_budgets(*budgets)
+    # Observers inherited through fork belong to the coordinator
+    clear_request_observers()
+    clear_story_observers()
+    run_worker(address, wait)
+
+
+def start_local_workers(
+    address: tuple[str, int],
+    count: int,
+    story_files: Sequence[Path] = (),
+    generated: tuple[int, int] = (0, 0),
+    wait: float = DEFAULT_WAIT,
+) -> list[multiprocessing.process.BaseProcess]:
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    processes: list[multiprocessing.process.BaseProcess] = [
+        context.Process(
+            target=_start_local_worker,
+            args=(
+                address,
+                client_config(),
+                list(story_files),
+                generated,
+                len(registered_test_stories()),
+                time_budgets(),
+                wait,
+            ),
+            name=f"load-worker-{index}",
+            daemon=True,
+        )
+        for index in range(count)
+    ]
+    for process in processes:
+        process.start()
+    return processes
+
+
+@dataclass
+class WorkerState:
+    name: str
+    assignment: Assignment
+    report: LoadReport = field(default_factory=LoadReport)
+    done: bool = False
+    error: str | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.done or self.error is not None
+
+
+@dataclass
+class DistributedReport:
+    workers: list[WorkerState]
+
+    def merged(self) -> LoadReport:
+        report = LoadReport()
+        for worker in self.workers:
+            report.merge(worker.report)
+        return report
+
+    @property
+    def errors(self) -> list[str]:
+        return [f"{worker.name}: {worker.error}" for worker in self.workers if worker.error is not None]
+
+
+def _accept_workers(
+    server: socket.socket, workers: int, stories: Sequence[str], wait: float
+) -> list[tuple[_Channel, str]]:
+    accepted: list[tuple[_Channel, str]] = []
+    deadline = perf_counter() + wait
+    try:
+        while len(accepted) < workers:
+            server.settimeout(max(deadline - perf_counter(), 0.001))
+            try:
+                connection, peer = server.accept()
+            except socket.timeout:
+                raise CoordinationError(
+                    f"Only {len(accepted)} of {workers} workers connected within {wait:g}s"
+                ) from None
+            connection.settimeout(None)
+            channel = _Channel(connection)
+            hello = channel.receive()
+            if hello is None or hello.get("type") != "hello":
+                channel.close()
+                continue
+            missing = [name for name in stories if name not in hello["stories"]]
+            if missing:
+                channel.send({"type": "reject", "message": f"Unknown stories {', '.join(missing)}"})
+                channel.close()
+                raise CoordinationError(
+                    f"Worker {hello['worker']} ({peer[0]}) lacks stories {', '.join(missing)},"
+                    " start it with the same --story-file"
+                )
+            accepted.append((channel, hello["worker"]))
+            print(f"Worker {hello['worker']} connected from {peer[0]} ({len(accepted)}/{workers})")
+    except BaseException:
+        for channel, _ in accepted:
+            channel.close()
+        raise
+    return accepted
+
+
+def _read_messages(channel: _Channel, worker: WorkerState, inbox: queue.Queue) -> None:
+    try:
+        while (message := channel.receive()) is not None:
+            inbox.put((worker, message))
+    except (OSError, ValueError) as err:
+        inbox.put((worker, {"type": "error", "message": f"{type(err).__name__}: {err}"}))
+    inbox.put((worker, None))
+
+
+def _print_progress(report: DistributedReport, elapsed: float, last_requests: int, interval: float) -> int:
+    merged = report.merged()
+    requests = sum(histogram.count for histogram in merged.histograms.values())
+    p99 = max((histogram.percentile(99) for histogram in merged.histograms.values()), default=0.0)
+    running = sum(1 for worker in report.workers if not worker.finished)
+    outcomes = ", ".join(f"{outcome}: {count}" for outcome, count in sorted(merged.outcomes.items()))
+    print(
+        f"[dim]{elapsed:6.1f}s[/dim] {running} workers running, {requests} requests"
+        f" ({(requests - last_requests) / interval:.0f} req/s), worst endpoint p99 {p99 * 1000:.2f} ms"
+        + (f", {outcomes}" if outcomes else "")
+    )
+    return requests
+
+
+def run_coordinator(
+    server: socket.socket, workers: int, assignment: Assignment, wait: float = DEFAULT_WAIT
+) -> DistributedReport:
+    """Hands a share of the virtual users to each worker and merges the histograms they stream back."""
+    host, port = server.getsockname()[:2]
+    print(f"Waiting for {workers} workers on {host}:{port}")
+    channels = _accept_workers(server, workers, assignment.stories, wait)
+    report = DistributedReport(
+        [
+            WorkerState(name, share)
+            for (_, name), share in zip(channels, split_assignment(assignment, workers))
+        ]
+    )
+    inbox: queue.Queue = queue.Queue()
+    try:
+        for (channel, _), worker in zip(channels, report.workers):
+            channel.send({"type": "assign", "assignment": asdict(worker.assignment)})
+            threading.Thread(
+                target=_read_messages,
+                args=(channel, worker, inbox),
+                name=f"worker-{worker.name}",
+                daemon=True,
+            ).start()
+        start = last_progress = perf_counter()
+        last_requests = 0
+        interval = assignment.report_interval
+        while not all(worker.finished for worker in report.workers):
+            try:
+                worker, message = inbox.get(timeout=max(last_progress + interval - perf_counter(), 0.0))
+            except queue.Empty:
+                last_progress = perf_counter()
+                last_requests = _print_progress(report, last_progress - start, last_requests, interval)
+                continue
+            if message is None:
+                if not worker.finished:
+                    worker.error = "Connection lost"
+            elif message["type"] == "report":
+                worker.report.merge(LoadReport.from_dict(message["report"]))
+            elif message["type"] == "done":
+                worker.report.elapsed = message["elapsed"]
+                worker.done = True
+            elif message["type"] == "error":
+                worker.error = message["message"]
+    finally:
+        for channel, _ in channels:
+            channel.close()
+    return report
+
+
+def print_worker_report(report: DistributedReport) -> None:
+    table = Table(title="Workers")
+    for column in ("Worker", "Users", "Requests", "Req/s", "p99 (ms)", "Outcomes", "Status"):
+        table.add_column(column, justify="left" if column in ("Worker", "Outcomes", "Status") else "right")
+    for worker in report.workers:
+        histograms = worker.report.histograms.values()
+        requests = sum(histogram.count for histogram in histograms)
+        table.add_row(
+            worker.name,
+            str(worker.assignment.users),
+            str(requests),
+            f"{requests / worker.report.elapsed:.1f}" if worker.report.elapsed else "-",
+            f"{max((histogram.percentile(99) for histogram in histograms), default=0.0) * 1000:.2f}",
+            ", ".join(f"{outcome}: {count}" for outcome, count in sorted(worker.report.outcomes.items())),
+            "[green]done" if worker.done else f"[red]{worker.error}",
+        )
+    print(table)
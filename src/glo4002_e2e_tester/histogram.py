@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import TypedDict
+
+SUB_BUCKET_BITS = 7
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+
+
+class LatencyHistogramDict(TypedDict):
+    counts: dict[str, int]
+    count: int
+    total: int
+    min: int
+    max: int
+
+
+def _bucket_index(value: int) -> int:
+    shift = max(0, value.bit_length() - SUB_BUCKET_BITS - 1)
+    return shift * SUB_BUCKET_COUNT + (value >> shift)
+
+
+def _bucket_value(index: int) -> int:
+    if index < 2 * SUB_BUCKET_COUNT:
+        return index
+    shift = index // SUB_BUCKET_COUNT - 1
+    mantissa = index - shift * SUB_BUCKET_COUNT
+    return (mantissa << shift) + (1 << shift) // 2
+
+
+class LatencyHistogram:
+    """Log-linear latency histogram in microseconds, mergeable across workers (~0.8% precision)."""
+
+    def __init__(self) -> None:
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = 0
+        self.max = 0
+
+    def record(self, seconds: float) -> None:
+        self.record_micros(max(0, round(seconds * 1_000_000)))
+
+    def record_micros(self, value: int, count: int = 1) -> None:
+        index = _bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        if self.count == 0 or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += count
+        self.total += value * count
+
+    def merge(self, other: LatencyHistogram) -> None:
+        if other.count == 0:
+            return
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.min = other.min if self.count == 0 else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def percentile(self, percentile: float) -> float:
+        if self.count == 0:
+            return 0.0
+        if percentile >= 100:
+            return self.max / 1_000_000
+        rank = max(1, round(self.count * percentile / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(_bucket_value(index), self.min), self.max) / 1_000_000
+        return self.max / 1_000_000
+
+    def mean(self) -> float:
+        return self.total / self.count / 1_000_000 if self.count else 0.0
+
+    def to_dict(self) -> LatencyHistogramDict:
+        return {
+            "counts": {str(index): count for index, count in self.counts.items()},
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Mapping) -> LatencyHistogram:
+        histogram = cls()
+        histogram.counts = {int(index): count for index, count in payload["counts"].items()}
+        histogram.count = payload["count"]
+        histogram.total = payload["total"]
+        histogram.min = payload["min"]
+        histogram.max = payload["max"]
+        return histogram
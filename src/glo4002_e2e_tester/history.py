@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import subprocess
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from statistics import mean, stdev
+from time import time
+from typing import NamedTuple
+
+from rich import print
+from rich.table import Table
+
+from .resources import Exchange
+from .tests import StoryResult
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    target TEXT NOT NULL,
+    server_revision TEXT
+);
+CREATE TABLE IF NOT EXISTS stories (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    story TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    message TEXT NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS steps (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    story TEXT,
+    step INTEGER NOT NULL,
+    endpoint TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    elapsed REAL NOT NULL,
+    connect REAL,
+    ttfb REAL,
+    read REAL
+);
+CREATE INDEX IF NOT EXISTS runs_target ON runs (target, id);
+CREATE INDEX IF NOT EXISTS stories_run ON stories (run_id);
+CREATE INDEX IF NOT EXISTS steps_run ON steps (run_id);
+"""
+
+
+@dataclass(frozen=True)
+class Regression:
+    kind: str
+    name: str
+    latest: float
+    baseline: float
+    deviation: float
+    runs: int
+
+
+@dataclass(frozen=True)
+class HistoryReport:
+    run_id: int
+    started_at: float
+    target: str
+    server_revision: str | None
+    baseline_runs: int
+    regressions: list[Regression]
+    newly_failing: list[str]
+
+
+class StepTiming(NamedTuple):
+    story: str | None
+    step: int
+    endpoint: str
+    status: int
+    elapsed: float
+    connect: float | None
+    ttfb: float | None
+    read: float | None
+
+
+class HistoryCollector:
+    """Request observer keeping only the timings saved in the history, never the request and response bytes."""
+
+    def __init__(self) -> None:
+        self.steps: list[StepTiming] = []
+        self._step_numbers: defaultdict[str | None, int] = defaultdict(int)
+
+    def __call__(self, exchange: Exchange) -> None:
+        self._step_numbers[exchange.story] += 1
+        self.steps.append(
+            StepTiming(
+                exchange.story,
+                self._step_numbers[exchange.story],
+                f"{exchange.method} {exchange.route}",
+                exchange.status,
+                exchange.elapsed,
+                exchange.connect,
+                exchange.ttfb,
+                exchange.read,
+            )
+        )
+
+
+def default_history_path() -> Path:
+    data_home = Path(os.environ.get("XDG_DATA_HOME", Path.home() / ".local" / "share"))
+    return data_home / "glo4002-e2e-tester" / "history.sqlite3"
+
+
+def server_revision() -> str | None:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5, check=True
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    connection = sqlite3.connect(path)
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+def save_run(
+    path: Path,
+    target: str,
+    revision: str | None,
+    results: Sequence[StoryResult],
+    steps: Iterable[StepTiming],
+    started_at: float | None = None,
+) -> int:
+    with closing(_connect(path)) as connection, connection:
+        run_id = connection.execute(
+            "INSERT INTO runs (started_at, target, server_revision) VALUES (?, ?, ?)",
+            (time() if started_at is None else started_at, target, revision),
+        ).lastrowid
+        assert run_id is not None
+        connection.executemany(
+            "INSERT INTO stories (run_id, story, outcome, message, duration) VALUES (?, ?, ?, ?, ?)",
+            [(run_id, result.name, result.outcome, result.message, result.duration) for result in results],
+        )
+        connection.executemany(
+            "INSERT INTO steps (run_id, story, step, endpoint, status, elapsed, connect, ttfb, read)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(run_id, *step) for step in steps],
+        )
+    return run_id
+
+
+def _metrics(
+    connection: sqlite3.Connection, run_ids: Sequence[int]
+) -> dict[tuple[str, str], dict[int, float]]:
+    placeholders = ", ".join("?" * len(run_ids))
+    metrics: defaultdict[tuple[str, str], dict[int, float]] = defaultdict(dict)
+    for run_id, story, duration in connection.execute(
+        f"SELECT run_id, story, duration FROM stories WHERE outcome = 'PASS' AND run_id IN ({placeholders})",
+        run_ids,
+    ):
+        metrics["story", story][run_id] = duration
+    # Per story, so that runs of different story selections only share the endpoints of their common stories
+    for run_id, story, endpoint, elapsed in connection.execute(
+        f"SELECT run_id, story, endpoint, AVG(elapsed) FROM steps WHERE run_id IN ({placeholders})"
+        " GROUP BY run_id, story, endpoint",
+        run_ids,
+    ):
+        metrics["endpoint", endpoint if story is None else f"{endpoint} in {story}"][run_id] = elapsed
+    return metrics
+
+
+def find_regressions(
+    path: Path,
+    baseline_runs: int = 10,
+    threshold: float = 3.0,
+    min_increase: float = 0.1,
+    target: str | None = None,
+) -> HistoryReport | None:
+    """Flags the latest run's story durations and per-story endpoint latencies above the baseline mean."""
+    with closing(_connect(path)) as connection:
+        query = "SELECT id, started_at, target, server_revision FROM runs"
+        latest = connection.execute(
+            query + (" WHERE target = ?" if target else "") + " ORDER BY id DESC LIMIT 1",
+            (target,) if target else (),
+        ).fetchone()
+        if latest is None:
+            return None
+        run_id, started_at, run_target, revision = latest
+        baseline_ids = [
+            row[0]
+            for row in connection.execute(
+                "SELECT id FROM runs WHERE target = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (run_target, run_id, baseline_runs),
+            )
+        ]
+        metrics = _metrics(connection, [run_id, *baseline_ids])
+        newly_failing = []
+        if baseline_ids:
+            previous = dict(
+                connection.execute("SELECT story, outcome FROM stories WHERE run_id = ?", (baseline_ids[0],))
+            )
+            newly_failing = [
+                story
+                for story, outcome in connection.execute(
+                    "SELECT story, outcome FROM stories WHERE run_id = ?", (run_id,)
+                )
+                if outcome != "PASS" and previous.get(story) == "PASS"
+            ]
+    regressions = []
+    for (kind, name), values in sorted(metrics.items()):
+        latest_value = values.get(run_id)
+        baseline = [values[baseline_id] for baseline_id in baseline_ids if baseline_id in values]
+        if latest_value is None or not baseline:
+            continue
+        baseline_mean = mean(baseline)
+        deviation = stdev(baseline) if len(baseline) > 1 else 0.0
+        if latest_value <= baseline_mean * (1 + min_increase):
+            continue
+        if deviation == 0.0 or (latest_value - baseline_mean) / deviation > threshold:
+            regressions.append(Regression(kind, name, latest_value, baseline_mean, deviation, len(baseline)))
+    return HistoryReport(
+        run_id, started_at, run_target, revision, len(baseline_ids), regressions, newly_failing
+    )
+
+
+def _millis(seconds: float) -> str:
+    return f"{seconds * 1000:.2f}"
+
+
+def print_history_report(report: HistoryReport) -> None:
+    print(
+        f"Run {report.run_id} on {report.target} at"
+        f" {datetime.fromtimestamp(report.started_at).isoformat(timespec='seconds')}"
+        f" (server revision {report.server_revision or 'unknown'}), compared with {report.baseline_runs} previous runs"
+    )
+    for story in report.newly_failing:
+        print(f" - FAIL : {story} - passed in the previous run")
+    if not report.regressions:
+        print("No latency regression")
+        return
+    table = Table(title="Latency regressions (ms)")
+    for column in ("Kind", "Name", "Latest", "Baseline", "Std dev", "Change", "Runs"):
+        table.add_column(column, justify="left" if column in ("Kind", "Name") else "right")
+    for regression in report.regressions:
+        table.add_row(
+            regression.kind,
+            regression.name,
+            _millis(regression.latest),
+            _millis(regression.baseline),
+            _millis(regression.deviation),
+            f"+{regression.latest / regression.baseline - 1:.0%}" if regression.baseline else "-",
+            str(regression.runs),
+        )
+    print(table)
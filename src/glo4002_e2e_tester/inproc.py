@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import json
+import threading
+from collections.abc import Awaitable, Callable, Iterable, MutableMapping
+from dataclasses import asdict
+from datetime import datetime
+from typing import Any
+
+from .models import (
+    DinoGender,
+    Dinosaurs,
+    DinoSpecies,
+    PostResourcesInvalidResourceQuantityError,
+    PostResourcesRequest,
+)
+from .resources import (
+    DINOSAURS_ENDPOINT,
+    HEARTBEAT_ENDPOINT,
+    RESET_ENDPOINT,
+    RESOURCE_ENDPOINT,
+    TURN_ENDPOINT,
+    Status,
+)
+from .simulator import ParkSimulator
+
+INPROC_BASE_URL = "http://inproc"
+
+_GENDERS = {gender.value: gender for gender in DinoGender if gender != DinoGender.INVALID}
+_SPECIES = {species.value: species for species in DinoSpecies if species != DinoSpecies.INVALID}
+
+Reply = tuple[int, Any]
+ASGIMessage = MutableMapping[str, Any]
+
+
+def _parse_dinosaur(payload: dict[str, Any]) -> Dinosaurs:
+    weight = payload.get("weight")
+    return Dinosaurs(
+        name=str(payload.get("name")),
+        weight=weight if isinstance(weight, int) else 0,
+        gender=_GENDERS.get(payload.get("gender", ""), DinoGender.INVALID),
+        species=_SPECIES.get(payload.get("species", ""), DinoSpecies.INVALID),
+    )
+
+
+class InProcessPark:
+    """Implements the REST contract on top of `ParkSimulator`, served through httpx's WSGI or ASGI transport."""
+
+    def __init__(self) -> None:
+        self.simulator = ParkSimulator()
+        self._lock = threading.Lock()
+
+    def handle(self, method: str, path: str, body: bytes) -> Reply:
+        with self._lock:
+            try:
+                return self._route(method, path, json.loads(body) if body else None)
+            except (ValueError, AttributeError):
+                return Status.BAD_REQUEST.value, {
+                    "error": "INVALID_REQUEST",
+                    "description": "Invalid payload.",
+                }
+
+    def _route(self, method: str, path: str, payload: Any) -> Reply:
+        simulator = self.simulator
+        if method == "POST" and path == TURN_ENDPOINT:
+            return Status.OK.value, asdict(simulator.turn())
+        if method == "POST" and path == RESET_ENDPOINT:
+            simulator.reset()
+            return Status.OK.value, None
+        if method == "GET" and path == HEARTBEAT_ENDPOINT:
+            return Status.OK.value, {"time": datetime.now().astimezone().isoformat()}
+        if method == "GET" and path == RESOURCE_ENDPOINT:
+            return Status.OK.value, asdict(simulator.resources())
+        if method == "POST" and path == RESOURCE_ENDPOINT:
+            quantities = [payload.get(key) or 0 for key in ("qtyBurger", "qtySalad", "qtyWater")]
+            if any(not isinstance(quantity, int) or quantity < 0 for quantity in quantities):
+                return Status.BAD_REQUEST.value, asdict(PostResourcesInvalidResourceQuantityError())
+            if any(quantities):
+                simulator.add_resources(PostResourcesRequest(*quantities))
+            return Status.OK.value, None
+        if method == "GET" and path == DINOSAURS_ENDPOINT:
+            return Status.OK.value, [dinosaur.to_dict() for dinosaur in simulator.dinosaurs()]
+        if method == "POST" and path == DINOSAURS_ENDPOINT:
+            error = simulator.add_dinosaur(_parse_dinosaur(payload))
+            if error is not None:
+                return Status.BAD_REQUEST.value, error.to_dict()
+            return Status.OK.value, None
+        if method == "GET" and path.startswith(f"{DINOSAURS_ENDPOINT}/"):
+            dinosaur = simulator.dinosaur(path[len(DINOSAURS_ENDPOINT) + 1 :])
+            status = Status.OK if isinstance(dinosaur, Dinosaurs) else Status.NOT_FOUND
+            return status.value, dinosaur.to_dict()
+        return Status.NOT_FOUND.value, None
+
+    @staticmethod
+    def _encode(reply: Reply) -> tuple[int, bytes]:
+        status, payload = reply
+        return status, b"" if payload is None else json.dumps(payload).encode()
+
+    def wsgi(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+        body = environ["wsgi.input"].read(length) if length else b""
+        status, content = self._encode(self.handle(environ["REQUEST_METHOD"], environ["PATH_INFO"], body))
+        start_response(
+            f"{status} {Status(status).name.replace('_', ' ')}",
+            [("Content-Type", "application/json"), ("Content-Length", str(len(content)))],
+        )
+        return [content]
+
+    async def asgi(
+        self,
+        scope: ASGIMessage,
+        receive: Callable[[], Awaitable[ASGIMessage]],
+        send: Callable[[ASGIMessage], Awaitable[None]],
+    ) -> None:
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        status, content = self._encode(self.handle(scope["method"], scope["path"], body))
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(content)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": content})
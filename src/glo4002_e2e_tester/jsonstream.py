@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import codecs
+import json
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+_WHITESPACE = " \t\n\r"
+
+
+class _Buffer:
+    __slots__ = ("chunks", "decoder", "text", "position", "exhausted")
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.position = 0
+        self.exhausted = False
+
+    def fill(self) -> bool:
+        if self.exhausted:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.exhausted = True
+            decoded = self.decoder.decode(b"", final=True)
+        else:
+            decoded = self.decoder.decode(chunk)
+        self.text = self.text[self.position :] + decoded
+        self.position = 0
+        return True
+
+    def skip_whitespace(self) -> str:
+        while True:
+            text, position = self.text, self.position
+            while position < len(text) and text[position] in _WHITESPACE:
+                position += 1
+            self.position = position
+            if position < len(text):
+                return text[position]
+            if not self.fill():
+                return ""
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """Yields the elements of a JSON array as the chunks of its encoding arrive, keeping one element in memory."""
+    decoder = json.JSONDecoder()
+    buffer = _Buffer(chunks)
+    if buffer.skip_whitespace() != "[":
+        raise ValueError("Expected a JSON array")
+    buffer.position += 1
+    if buffer.skip_whitespace() == "]":
+        return
+    while True:
+        while True:
+            try:
+                element, end = decoder.raw_decode(buffer.text, buffer.position)
+            except json.JSONDecodeError:
+                if not buffer.fill():
+                    raise
+                continue
+            if end < len(buffer.text) or buffer.exhausted:
+                break
+            buffer.fill()
+        buffer.position = end
+        yield element
+        delimiter = buffer.skip_whitespace()
+        buffer.position += 1
+        if delimiter == "]":
+            return
+        if delimiter != ",":
+            raise ValueError(f"Expected ',' or ']' after array element, got {delimiter or 'end of data'!r}")
+        buffer.skip_whitespace()
@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import threading
+from collections import Counter
+from collections.abc import Callable, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+from dataclasses import asdict, dataclass, field
+from functools import partial
+from pathlib import Path
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from rich import print
+from rich.table import Table
+
+from .clients import open_async_client
+from .histogram import LatencyHistogram
+from .models import DinoGender, Dinosaurs, DinoSpecies, PostResourcesRequest
+from .parallel import AsyncClientBridge
+from .resources import (
+    DINOSAURS_ENDPOINT,
+    HEARTBEAT_ENDPOINT,
+    RESET_ENDPOINT,
+    RESOURCE_ENDPOINT,
+    TURN_ENDPOINT,
+    Exchange,
+    add_request_observer,
+    remove_request_observer,
+    send_request,
+    use_client,
+)
+from .tests import TestStory, run_test_story
+from .timings import print_connection_reuse
+
+if TYPE_CHECKING:
+    from httpx import Response
+
+LoadCall = Callable[[random.Random], "Response"]
+
+DEFAULT_REPORT_INTERVAL = 1.0
+
+_VALID_GENDERS = [gender for gender in DinoGender if gender != DinoGender.INVALID]
+_VALID_SPECIES = [species for species in DinoSpecies if species != DinoSpecies.INVALID]
+
+
+def _random_dinosaur(rng: random.Random) -> Dinosaurs:
+    return Dinosaurs(
+        name=f"Load-{rng.getrandbits(64):016x}",
+        weight=rng.randint(1, 10000),
+        gender=rng.choice(_VALID_GENDERS),
+        species=rng.choice(_VALID_SPECIES),
+    )
+
+
+MIX_CALLS: Mapping[str, LoadCall] = {
+    "turn": lambda rng: send_request("POST", TURN_ENDPOINT),
+    "reset": lambda rng: send_request("POST", RESET_ENDPOINT),
+    "heartbeat": lambda rng: send_request("GET", HEARTBEAT_ENDPOINT),
+    "resources": lambda rng: send_request("GET", RESOURCE_ENDPOINT),
+    "post_resources": lambda rng: send_request(
+        "POST",
+        RESOURCE_ENDPOINT,
+        json=asdict(PostResourcesRequest(qtyBurger=rng.randint(1, 100))),
+    ),
+    "dinosaurs": lambda rng: send_request("GET", DINOSAURS_ENDPOINT),
+    "dinosaur": lambda rng: send_request(
+        "GET", f"{DINOSAURS_ENDPOINT}/{_random_dinosaur(rng).name}", route=f"{DINOSAURS_ENDPOINT}/{{name}}"
+    ),
+    "post_dinosaurs": lambda rng: send_request(
+        "POST", DINOSAURS_ENDPOINT, json=_random_dinosaur(rng).to_dict()
+    ),
+}
+
+
+def _succeeded(response: Response) -> bool:
+    return 200 <= response.status_code < 300
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights: dict[str, int] = {}
+    for item in mix.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in MIX_CALLS:
+            raise ValueError(f"Unknown call '{name}', expected one of {', '.join(MIX_CALLS)}")
+        weights[name] = int(weight or 1)
+    return weights
+
+
+@dataclass
+class LoadReport:
+    histograms: dict[str, LatencyHistogram] = field(default_factory=dict)
+    outcomes: Counter[str] = field(default_factory=Counter)
+    elapsed: float = 0.0
+    connections: int = 0
+
+    def record(self, exchange: Exchange) -> None:
+        endpoint = f"{exchange.method} {exchange.route}"
+        histogram = self.histograms.get(endpoint)
+        if histogram is None:
+            histogram = self.histograms[endpoint] = LatencyHistogram()
+        histogram.record(exchange.elapsed)
+        if exchange.connect is not None:
+            self.connections += 1
+
+    def merge(self, other: LoadReport) -> None:
+        for endpoint, histogram in other.histograms.items():
+            self.histograms.setdefault(endpoint, LatencyHistogram()).merge(histogram)
+        self.outcomes.update(other.outcomes)
+        self.elapsed = max(self.elapsed, other.elapsed)
+        self.connections += other.connections
+
+    def to_dict(self) -> dict:
+        return {
+            "histograms": {endpoint: histogram.to_dict() for endpoint, histogram in self.histograms.items()},
+            "outcomes": dict(self.outcomes),
+            "elapsed": self.elapsed,
+            "connections": self.connections,
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Mapping) -> LoadReport:
+        return cls(
+            histograms={
+                endpoint: LatencyHistogram.from_dict(histogram)
+                for endpoint, histogram in payload["histograms"].items()
+            },
+            outcomes=Counter(payload["outcomes"]),
+            elapsed=payload["elapsed"],
+            connections=payload.get("connections", 0),
+        )
+
+
+_user_report = threading.local()
+
+
+def _observe(exchange: Exchange) -> None:
+    report: LoadReport | None = getattr(_user_report, "report", None)
+    if report is not None:
+        report.record(exchange)
+
+
+def _virtual_user(
+    bridge: AsyncClientBridge,
+    seed: int,
+    stories: Sequence[TestStory],
+    mix: Mapping[str, int] | None,
+    iterations: int | None,
+    deadline: float | None,
+    on_report: Callable[[LoadReport], None] | None = None,
+    report_interval: float = DEFAULT_REPORT_INTERVAL,
+) -> LoadReport:
+    rng = random.Random(seed)
+    report = LoadReport()
+    _user_report.report = report
+    calls = [MIX_CALLS[name] for name in mix] if mix else []
+    weights = list(mix.values()) if mix else []
+    done = 0
+    next_report = perf_counter() + report_interval
+    try:
+        with use_client(bridge):
+            while (iterations is None or done < iterations) and (
+                deadline is None or perf_counter() < deadline
+            ):
+                if calls:
+                    try:
+                        succeeded = _succeeded(rng.choices(calls, weights)[0](rng))
+                    except Exception:
+                        succeeded = False
+                    report.outcomes["CALL" if succeeded else "ERROR"] += 1
+                else:
+                    report.outcomes[run_test_story(stories[done % len(stories)]).outcome] += 1
+                done += 1
+                if on_report is not None and perf_counter() >= next_report:
+                    on_report(report)
+                    report = _user_report.report = LoadReport()
+                    next_report = perf_counter() + report_interval
+    finally:
+        _user_report.report = None
+    if on_report is not None:
+        on_report(report)
+        return LoadReport()
+    return report
+
+
+async def run_load(
+    targets: Sequence[str],
+    users: int,
+    stories: Sequence[TestStory],
+    mix: Mapping[str, int] | None = None,
+    duration: float | None = None,
+    iterations: int | None = None,
+    seed: int = 0,
+    on_report: Callable[[LoadReport], None] | None = None,
+    report_interval: float = DEFAULT_REPORT_INTERVAL,
+) -> LoadReport:
+    """`on_report` receives each virtual user's report delta about every `report_interval` seconds, from its thread."""
+    loop = asyncio.get_running_loop()
+    report = LoadReport()
+    lock = threading.Lock()
+
+    def merge_delta(on_report: Callable[[LoadReport], None], delta: LoadReport) -> None:
+        with lock:
+            report.merge(delta)
+        on_report(delta)
+
+    add_request_observer(_observe, needs_body=False)
+    try:
+        async with AsyncExitStack() as stack:
+            bridges = [
+                AsyncClientBridge(
+                    await stack.enter_async_context(open_async_client(target, max_connections=users)),
+                    loop,
+                )
+                for target in targets
+            ]
+            start = perf_counter()
+            deadline = start + duration if duration is not None else None
+            with ThreadPoolExecutor(max_workers=users, thread_name_prefix="virtual-user") as executor:
+                user_reports = await asyncio.gather(
+                    *(
+                        loop.run_in_executor(
+                            executor,
+                            _virtual_user,
+                            bridges[user % len(bridges)],
+                            seed + user,
+                            stories,
+                            mix,
+                            iterations,
+                            deadline,
+                            partial(merge_delta, on_report) if on_report is not None else None,
+                            report_interval,
+                        )
+                        for user in range(users)
+                    )
+                )
+            elapsed = perf_counter() - start
+    finally:
+        remove_request_observer(_observe)
+    for user_report in user_reports:
+        report.merge(user_report)
+    report.elapsed = elapsed
+    return report
+
+
+@dataclass
+class OpenLoopReport(LoadReport):
+    """Latencies are measured from each call's intended send time, so a slow server cannot hold the rate back."""
+
+    target_rate: float = 0.0
+    duration: float = 0.0
+    service: dict[str, LatencyHistogram] = field(default_factory=dict)
+    send_lag: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def record_call(self, name: str, lag: float, service: float, latency: float, succeeded: bool) -> None:
+        self.outcomes["CALL" if succeeded else "ERROR"] += 1
+        self.send_lag.record(lag)
+        self.histograms.setdefault(name, LatencyHistogram()).record(latency)
+        self.service.setdefault(name, LatencyHistogram()).record(service)
+
+    @property
+    def achieved_rate(self) -> float:
+        span = max(self.elapsed, self.duration)
+        return sum(self.outcomes.values()) / span if span else 0.0
+
+    @property
+    def shortfall(self) -> float:
+        return max(0.0, 1 - self.achieved_rate / self.target_rate) if self.target_rate else 0.0
+
+
+def _open_loop_call(
+    bridge: AsyncClientBridge, call: LoadCall, seed: int, intended: float
+) -> tuple[float, float, float, bool]:
+    started = perf_counter()
+    try:
+        with use_client(bridge):
+            succeeded = _succeeded(call(random.Random(seed)))
+    except Exception:
+        succeeded = False
+    finished = perf_counter()
+    return max(0.0, started - intended), finished - started, finished - intended, succeeded
+
+
+async def run_open_loop(
+    targets: Sequence[str],
+    rate: float,
+    duration: float,
+    mix: Mapping[str, int],
+    concurrency: int,
+    seed: int = 0,
+) -> OpenLoopReport:
+    loop = asyncio.get_running_loop()
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    report = OpenLoopReport(target_rate=rate, duration=duration)
+    async with AsyncExitStack() as stack:
+        bridges = [
+            AsyncClientBridge(
+                await stack.enter_async_context(open_async_client(target, max_connections=concurrency)), loop
+            )
+            for target in targets
+        ]
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="open-loop") as executor:
+            calls = []
+            start = perf_counter()
+            for index in range(int(rate * duration)):
+                intended = start + index / rate
+                await asyncio.sleep(max(0.0, intended - perf_counter()))
+                name = rng.choices(names, weights)[0]
+                future = loop.run_in_executor(
+                    executor,
+                    _open_loop_call,
+                    bridges[index % len(bridges)],
+                    MIX_CALLS[name],
+                    rng.getrandbits(64),
+                    intended,
+                )
+                calls.append((name, future))
+            for name, future in calls:
+                report.record_call(name, *await future)
+            report.elapsed = perf_counter() - start
+    return report
+
+
+def _millis(seconds: float) -> str:
+    return f"{seconds * 1000:.2f}"
+
+
+def print_load_report(report: LoadReport) -> None:
+    table = Table(title="Latency per endpoint (ms)")
+    for column in ("Endpoint", "Count", "Req/s", "p50", "p90", "p99", "Max"):
+        table.add_column(column, justify="left" if column == "Endpoint" else "right")
+    total = 0
+    for endpoint in sorted(report.histograms):
+        histogram = report.histograms[endpoint]
+        total += histogram.count
+        table.add_row(
+            endpoint,
+            str(histogram.count),
+            f"{histogram.count / report.elapsed:.1f}" if report.elapsed else "-",
+            _millis(histogram.percentile(50)),
+            _millis(histogram.percentile(90)),
+            _millis(histogram.percentile(99)),
+            _millis(histogram.percentile(100)),
+        )
+    print(table)
+    throughput = f"{total / report.elapsed:.1f}" if report.elapsed else "-"
+    print(f"{total} requests in {report.elapsed:.2f}s ({throughput} req/s)")
+    print_connection_reuse(report.connections, total)
+    print(", ".join(f"{outcome}: {count}" for outcome, count in sorted(report.outcomes.items())))
+
+
+def print_open_loop_report(report: OpenLoopReport) -> None:
+    table = Table(title="Latency from intended send time (ms)")
+    for column in ("Call", "Count", "p50", "p90", "p99", "p99.9", "Max", "Service p99"):
+        table.add_column(column, justify="left" if column == "Call" else "right")
+    for name in sorted(report.histograms):
+        histogram = report.histograms[name]
+        table.add_row(
+            name,
+            str(histogram.count),
+            _millis(histogram.percentile(50)),
+            _millis(histogram.percentile(90)),
+            _millis(histogram.percentile(99)),
+            _millis(histogram.percentile(99.9)),
+            _millis(histogram.percentile(100)),
+            _millis(report.service[name].percentile(99)),
+        )
+    print(table)
+    print(
+        f"Target {report.target_rate:.1f} req/s, achieved {report.achieved_rate:.1f} req/s"
+        f" ({report.shortfall:.1%} short), send lag p99 {_millis(report.send_lag.percentile(99))} ms"
+    )
+    print(", ".join(f"{outcome}: {count}" for outcome, count in sorted(report.outcomes.items())))
+
+
+def save_load_report(report: LoadReport, path: Path) -> None:
+    path.write_text(json.dumps(report.to_dict()))
+
+
+def load_load_report(path: Path) -> LoadReport:
+    return LoadReport.from_dict(json.loads(path.read_text()))
@@ -1,10 +1,10 @@
 from __future__ import annotations
 
 from collections.abc import Collection
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import Literal, Optional, TypedDict, Union
+from typing import TYPE_CHECKING, Literal, Optional, TypedDict, Union
 
 
 class DinosaursDict(TypedDict):
@@ -112,10 +112,21 @@ class GetResourcesResponse:
 
 @dataclass(frozen=True)
 class Dinosaurs:
+    __slots__ = ("name", "weight", "gender", "species", "_force")
+
     name: str
     weight: int
     gender: DinoGender
     species: DinoSpecies
+    if TYPE_CHECKING:
+        # A slot at runtime, where a class-level field() would conflict with __slots__
+        _force: float = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "_force", dinosaur_force(self.weight, self.gender, self.species))
+
+    def __reduce__(self):
+        return Dinosaurs, (self.name, self.weight, self.gender, self.species)
 
     def to_dict(self) -> DinosaursDict:
         return {
@@ -126,17 +137,14 @@ class Dinosaurs:
         }
 
     def force(self) -> float:
-        return (
-            self.weight
-            * (1.5 if self.gender == DinoGender.FEMALE else 1)
-            * (1.5 if self.species in DinoCarnivore else 1)
-        )
+        return self._force
+
+    def __lt__(self, other: Dinosaurs) -> bool:
+        return self._force < other._force
 
-    def __lt__(self, other) -> bool:
-        return self.force() < other.force()
 
-    def __eq__(self, other) -> bool:
-        return self.force() == other.force()
+def dinosaur_force(weight: int, gender: DinoGender, species: DinoSpecies) -> float:
+    return weight * (1.5 if gender == DinoGender.FEMALE else 1) * (1.5 if species in DinoCarnivore else 1)
 
 
 @dataclass(frozen=True)
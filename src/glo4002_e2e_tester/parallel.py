@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable, Collection, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack
+from typing import Any
+
+from httpx import URL, AsyncClient, Response
+from rich import print
+
+from .clients import open_async_client
+from .resources import use_client
+from .tests import (
+    ServerHealth,
+    StoryResult,
+    TestStory,
+    print_story_result,
+    run_test_story,
+    select_test_stories,
+)
+
+
+def _async_trace(trace: Callable[[str, Any], None]) -> Callable[[str, Any], Awaitable[None]]:
+    async def async_trace(event_name: str, info: Any) -> None:
+        trace(event_name, info)
+
+    return async_trace
+
+
+class AsyncClientBridge:
+    def __init__(self, client: AsyncClient, loop: asyncio.AbstractEventLoop) -> None:
+        self._client = client
+        self._loop = loop
+
+    def request(self, method: str, url: URL | str, *args: Any, **kwargs: Any) -> Response:
+        extensions = kwargs.get("extensions")
+        if extensions and "trace" in extensions:
+            kwargs["extensions"] = {**extensions, "trace": _async_trace(extensions["trace"])}
+        future = asyncio.run_coroutine_threadsafe(
+            self._client.request(method, url, *args, **kwargs), self._loop
+        )
+        return future.result()
+
+
+def _run_bound_story(bridge: AsyncClientBridge, test_story: TestStory) -> StoryResult:
+    with use_client(bridge):
+        return run_test_story(test_story)
+
+
+async def run_on_targets(test_stories: Sequence[TestStory], targets: Sequence[str]) -> list[StoryResult]:
+    loop = asyncio.get_running_loop()
+    pending: asyncio.Queue[int] = asyncio.Queue()
+    for index in range(len(test_stories)):
+        pending.put_nowait(index)
+    results: list[StoryResult | None] = [None] * len(test_stories)
+    ready = asyncio.Event()
+
+    healths: list[ServerHealth] = []
+
+    async def target_worker(bridge: AsyncClientBridge, executor: ThreadPoolExecutor) -> None:
+        health = ServerHealth()
+        healths.append(health)
+        while health.healthy and not pending.empty():
+            index = pending.get_nowait()
+            result = await loop.run_in_executor(executor, _run_bound_story, bridge, test_stories[index])
+            results[index] = result
+            health.record(result)
+            ready.set()
+
+    async def report_in_order() -> None:
+        next_index = 0
+        while next_index < len(results):
+            await ready.wait()
+            ready.clear()
+            while next_index < len(results) and (result := results[next_index]) is not None:
+                print_story_result(result)
+                next_index += 1
+
+    async with AsyncExitStack() as stack:
+        bridges = [
+            AsyncClientBridge(await stack.enter_async_context(open_async_client(target)), loop)
+            for target in targets
+        ]
+        with ThreadPoolExecutor(max_workers=len(bridges), thread_name_prefix="story") as executor:
+            reporter = asyncio.create_task(report_in_order())
+            await asyncio.gather(*(target_worker(bridge, executor) for bridge in bridges))
+            while not pending.empty():
+                index = pending.get_nowait()
+                results[index] = healths[0].skipped(test_stories[index])
+            ready.set()
+            await reporter
+    return [result for result in results if result is not None]
+
+
+def run_test_stories_on_targets(stories: Collection[int] | None, targets: Sequence[str]) -> list[StoryResult]:
+    print("Run tests")
+    return asyncio.run(run_on_targets(select_test_stories(stories), targets))
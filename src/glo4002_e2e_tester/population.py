@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterable, Iterator, Sequence
+
+from .models import DinoCarnivore, DinoGender, Dinosaurs, DinoSpecies
+
+GENDER_CODES: tuple[DinoGender, ...] = tuple(DinoGender)
+SPECIES_CODES: tuple[DinoSpecies, ...] = tuple(DinoSpecies)
+FEMALE_CODE = GENDER_CODES.index(DinoGender.FEMALE)
+CARNIVORE_CODES = tuple(code for code, species in enumerate(SPECIES_CODES) if species in DinoCarnivore)
+
+_GENDER_INDEX = {gender: code for code, gender in enumerate(GENDER_CODES)}
+_SPECIES_INDEX = {species: code for code, species in enumerate(SPECIES_CODES)}
+
+
+class DinosaurPopulation(Sequence[Dinosaurs]):
+    """Column-oriented population: one array per attribute, `Dinosaurs` are only built when indexed."""
+
+    def __init__(self, dinosaurs: Iterable[Dinosaurs] = ()) -> None:
+        self.names: list[str] = []
+        self.weights = array("q")
+        self.genders = array("b")
+        self.species = array("b")
+        self.forces = array("d")
+        self.extend(dinosaurs)
+
+    def append(self, dinosaur: Dinosaurs) -> None:
+        self.names.append(dinosaur.name)
+        self.weights.append(dinosaur.weight)
+        self.genders.append(_GENDER_INDEX[dinosaur.gender])
+        self.species.append(_SPECIES_INDEX[dinosaur.species])
+        self.forces.append(dinosaur.force())
+
+    def extend(self, dinosaurs: Iterable[Dinosaurs]) -> None:
+        for dinosaur in dinosaurs:
+            self.append(dinosaur)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        return Dinosaurs(
+            name=self.names[index],
+            weight=self.weights[index],
+            gender=GENDER_CODES[self.genders[index]],
+            species=SPECIES_CODES[self.species[index]],
+        )
+
+    def __iter__(self) -> Iterator[Dinosaurs]:
+        return map(self.__getitem__, range(len(self)))
+
+    def expected_order(self) -> list[int]:
+        return expected_order(self.weights, self.genders, self.species)
+
+    def in_expected_order(self) -> Iterator[Dinosaurs]:
+        return map(self.__getitem__, self.expected_order())
+
+
+def expected_order(weights: Sequence[int], genders: Sequence[int], species: Sequence[int]) -> list[int]:
+    """Indices of the population by descending force, ties kept in arrival order, as `GET /dinosaurs` lists them."""
+    try:
+        import numpy
+    except ImportError:
+        carnivores = set(CARNIVORE_CODES)
+        forces = [
+            weight * (1.5 if gender == FEMALE_CODE else 1) * (1.5 if code in carnivores else 1)
+            for weight, gender, code in zip(weights, genders, species)
+        ]
+        return sorted(range(len(forces)), key=forces.__getitem__, reverse=True)
+    forces = (
+        numpy.asarray(weights, dtype=numpy.float64)
+        * numpy.where(numpy.asarray(genders) == FEMALE_CODE, 1.5, 1.0)
+        * numpy.where(numpy.isin(numpy.asarray(species), CARNIVORE_CODES), 1.5, 1.0)
+    )
+    order: list[int] = numpy.argsort(-forces, kind="stable").tolist()
+    return order
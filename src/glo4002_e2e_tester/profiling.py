@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import cProfile
+import pstats
+import re
+import tracemalloc
+from collections.abc import Collection
+from dataclasses import dataclass
+from pathlib import Path
+
+from rich import print
+from rich.table import Table
+
+from . import resources
+from .clients import get_client
+from .tests import (
+    ServerHealth,
+    StoryResult,
+    print_story_result,
+    registered_test_stories,
+    run_test_story,
+    select_test_story_indices,
+)
+
+# Builtins a request blocks in while waiting on the network (or on the server behind it)
+_BLOCKING_OBJECTS = (
+    "of '_socket.socket' objects>",
+    "of '_ssl._SSLSocket' objects>",
+    "of 'select.poll' objects>",
+    "of 'select.epoll' objects>",
+    "<built-in method select.select>",
+)
+_UNSAFE_FILENAME = re.compile(r"[^\w.-]+")
+_REQUEST = (resources.__file__, resources.send_request.__code__.co_firstlineno, "send_request")
+
+
+@dataclass(frozen=True)
+class StoryProfile:
+    result: StoryResult
+    path: Path
+    network_wait: float
+    http: float
+    peak_memory: int | None = None
+
+
+@dataclass(frozen=True)
+class HelperTiming:
+    helper: str
+    calls: int
+    total: float
+    http: float
+
+    @property
+    def tester(self) -> float:
+        return max(self.total - self.http, 0.0)
+
+
+def profile_path(directory: Path, index: int, name: str) -> Path:
+    return directory / f"{index:02d}_{_UNSAFE_FILENAME.sub('_', name)}.prof"
+
+
+def network_wait(stats: pstats.Stats) -> float:
+    return sum(
+        entry[2]
+        for (filename, _, name), entry in stats.stats.items()  # type: ignore[attr-defined]
+        if filename == "~" and any(marker in name for marker in _BLOCKING_OBJECTS)
+    )
+
+
+def helper_timings(stats: pstats.Stats) -> list[HelperTiming]:
+    """Time of each function calling `send_request`, split between the HTTP call and the tester's own work."""
+    entries: dict[tuple[str, int, str], tuple] = stats.stats  # type: ignore[attr-defined]
+    request = entries.get(_REQUEST)
+    if request is None:
+        return []
+    timings = [
+        HelperTiming(caller[2], entries[caller][1], entries[caller][3], http)
+        for caller, (_, _, _, http) in request[4].items()
+        if caller in entries
+    ]
+    return sorted(timings, key=lambda timing: timing.total, reverse=True)
+
+
+def profile_test_stories(
+    stories: Collection[int] | None, directory: Path, memory: bool = False
+) -> tuple[list[StoryResult], list[StoryProfile], pstats.Stats | None]:
+    directory.mkdir(parents=True, exist_ok=True)
+    results: list[StoryResult] = []
+    profiles: list[StoryProfile] = []
+    combined: pstats.Stats | None = None
+    health = ServerHealth()
+    get_client()
+    print("Run tests")
+    if memory:
+        tracemalloc.start()
+    try:
+        for index in select_test_story_indices(stories):
+            test_story = registered_test_stories()[index]
+            if not health.healthy:
+                results.append(health.skipped(test_story))
+                print_story_result(results[-1])
+                continue
+            if memory:
+                tracemalloc.reset_peak()
+            profiler = cProfile.Profile()
+            result = profiler.runcall(run_test_story, test_story)
+            peak_memory = tracemalloc.get_traced_memory()[1] if memory else None
+            path = profile_path(directory, index, test_story.__name__)
+            profiler.dump_stats(path)
+            stats = pstats.Stats(profiler)
+            request = stats.stats.get(_REQUEST)  # type: ignore[attr-defined]
+            profiles.append(
+                StoryProfile(result, path, network_wait(stats), request[3] if request else 0.0, peak_memory)
+            )
+            combined = stats if combined is None else combined.add(stats)
+            results.append(result)
+            health.record(result)
+            print_story_result(result)
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return results, profiles, combined
+
+
+def _millis(seconds: float) -> str:
+    return f"{seconds * 1000:.2f}"
+
+
+def _share(part: float, total: float) -> str:
+    return f"{part / total:.0%}" if total else "-"
+
+
+def print_profile_report(profiles: Collection[StoryProfile], combined: pstats.Stats | None) -> None:
+    stories = Table(title="Stories under the profiler (ms)")
+    columns = ["Story", "Duration", "Network wait", "Client CPU", "In HTTP", "Tester"]
+    if any(profile.peak_memory is not None for profile in profiles):
+        columns.append("Peak KiB")
+    for index, column in enumerate(columns):
+        stories.add_column(column, justify="left" if index == 0 else "right")
+    for profile in profiles:
+        duration = profile.result.duration
+        row = [
+            profile.result.name,
+            _millis(duration),
+            _millis(profile.network_wait),
+            f"{_millis(duration - profile.network_wait)} ({_share(duration - profile.network_wait, duration)})",
+            _millis(profile.http),
+            f"{_millis(duration - profile.http)} ({_share(duration - profile.http, duration)})",
+        ]
+        if len(columns) > 6:
+            row.append("-" if profile.peak_memory is None else f"{profile.peak_memory / 1024:.0f}")
+        stories.add_row(*row)
+    print(stories)
+    if combined is not None:
+        helpers = Table(title="Helpers, all stories (ms)")
+        for index, column in enumerate(("Helper", "Calls", "Total", "In HTTP", "Tester", "Tester share")):
+            helpers.add_column(column, justify="left" if index == 0 else "right")
+        for timing in helper_timings(combined):
+            helpers.add_row(
+                timing.helper,
+                str(timing.calls),
+                _millis(timing.total),
+                _millis(timing.http),
+                _millis(timing.tester),
+                _share(timing.tester, timing.total),
+            )
+        print(helpers)
+    if profiles:
+        print(
+            f"Profiles written to {next(iter(profiles)).path.parent} (open with `python -m pstats` or snakeviz)"
+        )
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import threading
+from collections.abc import Iterator
+from dataclasses import replace
+from itertools import groupby
+from pathlib import Path
+from typing import IO, Any
+
+from httpx import URL, BaseTransport, Client, Request, Response
+from rich import print
+
+from .clients import JSON_HEADERS
+from .resources import Exchange, use_client
+from .tests import (
+    StoryResult,
+    TestStory,
+    print_story_result,
+    registered_test_stories,
+    run_test_story,
+)
+
+REPLAY_BASE_URL = "http://replay"
+
+
+def open_trace(path: Path, mode: str) -> IO[str]:
+    if path.suffix == ".gz":
+        return io.TextIOWrapper(gzip.GzipFile(path, mode), encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _decode(content: bytes) -> str | None:
+    return content.decode("utf-8") if content else None
+
+
+class TraceRecorder:
+    def __init__(self, path: Path) -> None:
+        self._file = open_trace(path, "w")
+        self._lock = threading.Lock()
+
+    def __call__(self, exchange: Exchange) -> None:
+        line = json.dumps(
+            {
+                "ts": exchange.started_at,
+                "story": exchange.story,
+                "method": exchange.method,
+                "path": exchange.path,
+                "request": _decode(exchange.request_content),
+                "status": exchange.status,
+                "response": _decode(exchange.response_content),
+                "elapsed": exchange.elapsed,
+            }
+        )
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def iter_trace(path: Path) -> Iterator[dict[str, Any]]:
+    with open_trace(path, "r") as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _same_body(recorded: str | None, sent: bytes) -> bool:
+    if not recorded or not sent:
+        return not recorded and not sent
+    return bool(json.loads(recorded) == json.loads(sent))
+
+
+class ReplayTransport(BaseTransport):
+    def __init__(self, records: Iterator[dict[str, Any]]) -> None:
+        self._records = records
+        self.served = 0
+
+    def handle_request(self, request: Request) -> Response:
+        record = next(self._records, None)
+        sent = f"{request.method} {request.url.raw_path.decode()}"
+        assert record is not None, f"Replay: {sent} was not recorded"
+        recorded = f"{record['method']} {record['path']}"
+        assert recorded == sent, f"Replay: request {sent} != recorded {recorded}"
+        body = request.read()
+        assert _same_body(
+            record["request"], body
+        ), f"Replay: {sent} body {body.decode() or None} != recorded {record['request']}"
+        self.served += 1
+        content = (record["response"] or "").encode("utf-8")
+        return Response(
+            record["status"],
+            headers={"Content-Type": "application/json", "Content-Length": str(len(content))},
+            content=content,
+            request=request,
+        )
+
+
+def _replay_story(test_story: TestStory, records: Iterator[dict[str, Any]]) -> StoryResult:
+    transport = ReplayTransport(records)
+    with Client(headers=JSON_HEADERS, base_url=URL(url=REPLAY_BASE_URL), transport=transport) as client:
+        with use_client(client):
+            result = run_test_story(test_story)
+    left = sum(1 for _ in records)
+    if result.outcome == "PASS" and left:
+        return replace(result, outcome="FAIL", message=f"Replay: {left} recorded requests were not replayed")
+    return result
+
+
+def replay_trace(path: Path) -> list[StoryResult]:
+    stories = {test_story.__name__: test_story for test_story in registered_test_stories()}
+    results = []
+    print("Replay tests")
+    for name, records in groupby(iter_trace(path), key=lambda record: record["story"]):
+        test_story = stories.get(name)
+        if test_story is None:
+            result = StoryResult(str(name), "ERROR", "Replay: story is not registered")
+            sum(1 for _ in records)
+        else:
+            result = _replay_story(test_story, records)
+        results.append(result)
+        print_story_result(result)
+    return results
@@ -1,33 +1,332 @@
 from __future__ import annotations
 
-from dataclasses import asdict
+import json
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from dataclasses import asdict, dataclass, field
 from enum import IntEnum
 from pprint import pformat
+from queue import SimpleQueue
+from threading import Thread
+from time import perf_counter, time
+from typing import TYPE_CHECKING, Any, Protocol
 
-from httpx import URL, Client, Headers
-from rich import print
-
+from .clients import get_client
+from .diff import describe, render_diff
+from .jsonstream import iter_json_array
 from .models import (
     Dinosaurs,
+    DuplicateNameError,
     GetDinosaurByNameResponses,
     GetDinosaursResponse,
     GetResourcesResponse,
+    InvalidError,
+    InvalidGenderError,
+    InvalidSpeciesError,
+    InvalidWeightError,
     PostDinosaursResponses,
     PostResourcesRequest,
     PostResourcesResponses,
     PostTurnResponse,
 )
 
-CLIENT = Client(
-    headers=Headers({"Content-Type": "application/json"}),
-    base_url=URL(url="http://localhost:8181"),
-)
+if TYPE_CHECKING:
+    from httpx import URL, Client, Response
 
 TURN_ENDPOINT = "/turn"
 RESET_ENDPOINT = "/reset"
 RESOURCE_ENDPOINT = "/resources"
 DINOSAURS_ENDPOINT = "/dinosaurs"
 HEARTBEAT_ENDPOINT = "/heartbeat"
+STREAMING_THRESHOLD = 1000
+DEFAULT_SEED_IN_FLIGHT = 32
+
+_SEED_ERRORS: dict[str, type[InvalidError]] = {
+    error.error: error
+    for error in (InvalidGenderError, InvalidWeightError, InvalidSpeciesError, DuplicateNameError)
+}
+
+
+def __getattr__(name: str) -> Client:
+    if name == "CLIENT":
+        return get_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class RequestSender(Protocol):
+    def request(self, method: str, url: URL | str, *args: Any, **kwargs: Any) -> Response: ...
+
+
+@dataclass(frozen=True)
+class Exchange:
+    story: str | None
+    method: str
+    route: str
+    path: str
+    status: int
+    started_at: float
+    elapsed: float
+    connect: float | None = None
+    ttfb: float | None = None
+    read: float | None = None
+    request_content: bytes = b""
+    response_content: bytes = b""
+
+
+RequestObserver = Callable[[Exchange], None]
+
+_request_observers: list[RequestObserver] = []
+# Observers reading request and response bytes, streamed responses are buffered for them
+_body_observers: list[RequestObserver] = []
+_current_client: ContextVar[RequestSender | None] = ContextVar("current_client", default=None)
+_current_story: ContextVar[str | None] = ContextVar("current_story", default=None)
+_current_deadline: ContextVar[float | None] = ContextVar("current_deadline", default=None)
+_step_timeout: float | None = None
+_story_timeout: float | None = None
+
+
+class StepTimeout(TimeoutError):
+    pass
+
+
+@contextmanager
+def use_client(client: RequestSender) -> Iterator[None]:
+    token = _current_client.set(client)
+    try:
+        yield
+    finally:
+        _current_client.reset(token)
+
+
+@contextmanager
+def use_story(name: str) -> Iterator[None]:
+    token = _current_story.set(name)
+    try:
+        yield
+    finally:
+        _current_story.reset(token)
+
+
+def set_time_budgets(step_timeout: float | None, story_timeout: float | None) -> None:
+    global _step_timeout, _story_timeout
+    _step_timeout, _story_timeout = step_timeout, story_timeout
+
+
+def time_budgets() -> tuple[float | None, float | None]:
+    return _step_timeout, _story_timeout
+
+
+def story_time_budget() -> float | None:
+    return _story_timeout
+
+
+@contextmanager
+def story_deadline() -> Iterator[None]:
+    token = _current_deadline.set(None if _story_timeout is None else perf_counter() + _story_timeout)
+    try:
+        yield
+    finally:
+        _current_deadline.reset(token)
+
+
+def _request_timeout(method: str, endpoint: str) -> float | None:
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return _step_timeout
+    remaining = deadline - perf_counter()
+    if remaining <= 0:
+        raise StepTimeout(f"{method} '{endpoint}': story time budget of {_story_timeout:g}s exhausted")
+    return remaining if _step_timeout is None else min(remaining, _step_timeout)
+
+
+def _is_timeout(err: Exception) -> bool:
+    from httpx import TimeoutException
+
+    return isinstance(err, TimeoutException)
+
+
+def add_request_observer(observer: RequestObserver, needs_body: bool = True) -> None:
+    """Observers with `needs_body=False` get exchanges without their content and leave responses streamed."""
+    _request_observers.append(observer)
+    if needs_body:
+        _body_observers.append(observer)
+
+
+def remove_request_observer(observer: RequestObserver) -> None:
+    _request_observers.remove(observer)
+    if observer in _body_observers:
+        _body_observers.remove(observer)
+
+
+def clear_request_observers() -> None:
+    _request_observers.clear()
+    _body_observers.clear()
+
+
+def has_request_observers(needs_body: bool = False) -> bool:
+    return bool(_body_observers if needs_body else _request_observers)
+
+
+def notify_request_observers(exchange: Exchange) -> None:
+    for observer in _request_observers:
+        observer(exchange)
+
+
+class _PhaseTimer:
+    def __init__(self) -> None:
+        self.marks: dict[str, float] = {}
+
+    def __call__(self, event_name: str, info: Any) -> None:
+        self.marks[event_name.partition(".")[2]] = perf_counter()
+
+    def span(self, step: str) -> float | None:
+        started, completed = self.marks.get(f"{step}.started"), self.marks.get(f"{step}.complete")
+        return None if started is None or completed is None else completed - started
+
+
+def send_request(method: str, endpoint: str, route: str | None = None, **kwargs: Any) -> Response:
+    """Sends through the current client within the time budgets and notifies the request observers."""
+    client = _current_client.get()
+    if client is None:
+        client = get_client()
+    timeout = _request_timeout(method, endpoint)
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    phases = _PhaseTimer()
+    started_at = time()
+    start = perf_counter()
+    try:
+        response = client.request(method, endpoint, extensions={"trace": phases}, **kwargs)
+    except Exception as err:
+        if _is_timeout(err):
+            raise StepTimeout(f"{method} '{endpoint}': no response in time ({type(err).__name__})") from err
+        raise
+    if _request_observers:
+        _notify_exchange(method, endpoint, route, response, phases, started_at, start)
+    return response
+
+
+def _notify_exchange(
+    method: str,
+    endpoint: str,
+    route: str | None,
+    response: Response,
+    phases: _PhaseTimer,
+    started_at: float,
+    start: float,
+) -> None:
+    elapsed = perf_counter() - start
+    headers_received = phases.marks.get("receive_response_headers.complete")
+    connect, tls = phases.span("connect_tcp"), phases.span("start_tls")
+    exchange = Exchange(
+        story=_current_story.get(),
+        method=method,
+        route=route or endpoint,
+        path=endpoint,
+        status=response.status_code,
+        started_at=started_at,
+        elapsed=elapsed,
+        connect=None if connect is None else connect + (tls or 0.0),
+        ttfb=None if headers_received is None else headers_received - start,
+        read=phases.span("receive_response_body"),
+        request_content=response.request.content if _body_observers else b"",
+        response_content=response.content if _body_observers else b"",
+    )
+    notify_request_observers(exchange)
+
+
+@contextmanager
+def _stream_request(
+    method: str, endpoint: str, route: str | None = None, **kwargs: Any
+) -> Iterator[Response]:
+    client = _current_client.get()
+    if client is None:
+        client = get_client()
+    stream = getattr(client, "stream", None)
+    if stream is None or _body_observers or _current_verifier.get() is not None:
+        yield send_request(method, endpoint, route, **kwargs)
+        return
+    timeout = _request_timeout(method, endpoint)
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    phases = _PhaseTimer()
+    started_at = time()
+    start = perf_counter()
+    try:
+        with stream(method, endpoint, extensions={"trace": phases}, **kwargs) as response:
+            try:
+                yield response
+            finally:
+                if _request_observers:
+                    _notify_exchange(method, endpoint, route, response, phases, started_at, start)
+    except Exception as err:
+        if _is_timeout(err):
+            raise StepTimeout(f"{method} '{endpoint}': no response in time ({type(err).__name__})") from err
+        raise
+
+
+class DeferredVerifier:
+    def __init__(self) -> None:
+        self.mismatches: list[str] = []
+        self._steps = 0
+        self._queue: SimpleQueue[tuple[int, Callable[..., None], Response, tuple] | None] = SimpleQueue()
+        self._thread = Thread(target=self._verify_in_background, name="deferred-verifier", daemon=True)
+        self._thread.start()
+
+    def submit(self, check: Callable[..., None], response: Response, args: tuple) -> None:
+        self._steps += 1
+        self._queue.put((self._steps, check, response, args))
+
+    def _verify_in_background(self) -> None:
+        while (item := self._queue.get()) is not None:
+            step, check, response, args = item
+            try:
+                check(response, *args)
+            except AssertionError as err:
+                self.mismatches.append(f"step {step}: {err}")
+            except Exception as err:
+                self.mismatches.append(f"step {step}: {type(err).__name__}: {err}")
+
+    def finish(self) -> list[str]:
+        self._queue.put(None)
+        self._thread.join()
+        return self.mismatches
+
+
+_deferred_verification = False
+_current_verifier: ContextVar[DeferredVerifier | None] = ContextVar("current_verifier", default=None)
+
+
+def set_deferred_verification(enabled: bool) -> None:
+    global _deferred_verification
+    _deferred_verification = enabled
+
+
+@contextmanager
+def verification_scope() -> Iterator[None]:
+    if not _deferred_verification:
+        yield
+        return
+    verifier = DeferredVerifier()
+    token = _current_verifier.set(verifier)
+    try:
+        yield
+    finally:
+        _current_verifier.reset(token)
+        mismatches = verifier.finish()
+    if mismatches:
+        raise AssertionError(f"{len(mismatches)} mismatches\n" + "\n".join(mismatches))
+
+
+def verify_response(response: Response, check: Callable[..., None], *args: Any) -> None:
+    """Runs `check(response, *args)` now, or later on the verifier thread when verification is deferred."""
+    verifier = _current_verifier.get()
+    if verifier is None:
+        check(response, *args)
+    else:
+        verifier.submit(check, response, args)
 
 
 class Status(IntEnum):
@@ -37,8 +336,10 @@ class Status(IntEnum):
 
 
 def get_heartbeat(expected_status: Status = Status.OK) -> None:
-    response = CLIENT.get(HEARTBEAT_ENDPOINT)
+    verify_response(send_request("GET", HEARTBEAT_ENDPOINT), _check_get_heartbeat, expected_status)
+
 
+def _check_get_heartbeat(response: Response, expected_status: Status) -> None:
     assert expected_status.value == response.status_code, (
         f"GET `/hearthbeat: Invalid status code {pformat(expected_status, sort_dicts=False)}"
         f" != {pformat(response.status_code, sort_dicts=False)}"
@@ -50,20 +351,27 @@ def get_heartbeat(expected_status: Status = Status.OK) -> None:
 
 
 def post_turn(expected_response: PostTurnResponse, expected_status: Status = Status.OK) -> None:
-    response = CLIENT.post(TURN_ENDPOINT)
+    verify_response(send_request("POST", TURN_ENDPOINT), _check_post_turn, expected_response, expected_status)
+
+
+def _check_post_turn(
+    response: Response, expected_response: PostTurnResponse, expected_status: Status
+) -> None:
     assert expected_status.value == response.status_code, (
         f"POST '/turn': Invalid status code {pformat(expected_status, sort_dicts=False)}"
         f" != {pformat(response.status_code, sort_dicts=False)}"
     )
-    assert asdict(expected_response) == response.json(), (
-        f"POST '/turn': Invalid payload\nExpected:\n{pformat(asdict(expected_response), sort_dicts=False)}\n "
-        f" !=\nRECEIVED\n{pformat(response.json(), sort_dicts=False)}"
+    expected_payload, received = asdict(expected_response), response.json()
+    assert expected_payload == received, render_diff(
+        "POST '/turn': Invalid payload", expected_payload, received
     )
 
 
 def post_reset(expected_status: Status = Status.OK) -> None:
-    response = CLIENT.post(RESET_ENDPOINT)
+    verify_response(send_request("POST", RESET_ENDPOINT), _check_post_reset, expected_status)
 
+
+def _check_post_reset(response: Response, expected_status: Status) -> None:
     assert expected_status.value == response.status_code, (
         f"POST '/reset': Invalid status code {pformat(expected_status, sort_dicts=False)}"
         f" != {pformat(response.status_code, sort_dicts=False)}"
@@ -75,32 +383,45 @@ def post_resources(
     expected_response: PostResourcesResponses = None,
     expected_status: Status = Status.OK,
 ) -> None:
-    response = CLIENT.post(RESOURCE_ENDPOINT, json=asdict(request_payload))
+    verify_response(
+        send_request("POST", RESOURCE_ENDPOINT, json=asdict(request_payload)),
+        _check_post_resources,
+        expected_response,
+        expected_status,
+    )
 
+
+def _check_post_resources(
+    response: Response, expected_response: PostResourcesResponses, expected_status: Status
+) -> None:
     assert expected_status.value == response.status_code, (
         f"POST '/resources': Invalid status code {pformat(expected_status, sort_dicts=False)}"
         f" != {pformat(response.status_code, sort_dicts=False)}"
     )
     if expected_response is not None:
-        assert asdict(expected_response) == response.json(), (
-            "POST '/resources': Invalid"
-            f" payload\nExpected:\n{pformat(asdict(expected_response), sort_dicts=False)}\n "
-            f" !=\nRECEIVED\n{pformat(response.json(), sort_dicts=False)}"
+        expected_payload, received = asdict(expected_response), response.json()
+        assert expected_payload == received, render_diff(
+            "POST '/resources': Invalid payload", expected_payload, received
         )
 
 
 def get_resources(expected_response: GetResourcesResponse, expected_status: Status = Status.OK) -> None:
-    response = CLIENT.get(RESOURCE_ENDPOINT)
+    verify_response(
+        send_request("GET", RESOURCE_ENDPOINT), _check_get_resources, expected_response, expected_status
+    )
+
 
+def _check_get_resources(
+    response: Response, expected_response: GetResourcesResponse, expected_status: Status
+) -> None:
     assert expected_status.value == response.status_code, (
         f"GET '/resources': Invalid status code {pformat(expected_status, sort_dicts=False)}"
         f" != {pformat(response.status_code, sort_dicts=False)}"
     )
     if expected_response is not None:
-        assert asdict(expected_response) == response.json(), (
-            "GET '/resources': Invalid"
-            f" payload\nExpected:\n{pformat(asdict(expected_response), sort_dicts=False)}\n "
-            f" !=\nRECEIVED\n{pformat(response.json(), sort_dicts=False)}"
+        expected_payload, received = asdict(expected_response), response.json()
+        assert expected_payload == received, render_diff(
+            "GET '/resources': Invalid payload", expected_payload, received
         )
 
 
@@ -109,55 +430,180 @@ def post_dinosaurs(
     expected_response: PostDinosaursResponses = None,
     expected_status: Status = Status.OK,
 ) -> None:
-    response = CLIENT.post(DINOSAURS_ENDPOINT, json=request_payload.to_dict())
+    verify_response(
+        send_request("POST", DINOSAURS_ENDPOINT, json=request_payload.to_dict()),
+        _check_post_dinosaurs,
+        expected_response,
+        expected_status,
+    )
+
 
+def _check_post_dinosaurs(
+    response: Response, expected_response: PostDinosaursResponses, expected_status: Status
+) -> None:
     assert expected_status.value == response.status_code, (
         f"POST '/dinosaurs': Invalid status code {pformat(expected_status, sort_dicts=False)}"
         f" != {pformat(response.status_code, sort_dicts=False)}"
     )
     if expected_response is not None:
-        assert expected_response.to_dict() == response.json(), (
-            "POST '/dinosaurs': Invalid"
-            f" payload\nExpected:\n{pformat(expected_response.to_dict(), sort_dicts=False)}\n "
-            f" !=\nRECEIVED\n{pformat(response.json(), sort_dicts=False)}"
+        expected_payload, received = expected_response.to_dict(), response.json()
+        assert expected_payload == received, render_diff(
+            "POST '/dinosaurs': Invalid payload", expected_payload, received
         )
 
 
+@dataclass(frozen=True)
+class SeedFailure:
+    index: int
+    dinosaur: Dinosaurs
+    status: int
+    error: InvalidError | str
+
+
+@dataclass
+class SeedReport:
+    sent: int = 0
+    failures: list[SeedFailure] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.sent / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.sent} dinosaurs sent in {self.elapsed:.2f}s ({self.requests_per_second:.1f} req/s),"
+            f" {len(self.failures)} rejected"
+        )
+
+
+def _seed_failure(index: int, dinosaur: Dinosaurs, response: Response) -> SeedFailure:
+    error: InvalidError | str
+    try:
+        payload = response.json()
+        error = _SEED_ERRORS.get(payload["error"], InvalidError)(**payload)
+    except (ValueError, KeyError, TypeError, AssertionError):
+        error = response.text
+    return SeedFailure(index, dinosaur, response.status_code, error)
+
+
+def seed_dinosaurs(dinosaurs: Iterable[Dinosaurs], in_flight: int = DEFAULT_SEED_IN_FLIGHT) -> SeedReport:
+    report = SeedReport()
+    pending: dict[Future[Response], tuple[int, Dinosaurs]] = {}
+
+    def collect(done: Iterable[Future[Response]]) -> None:
+        for future in done:
+            index, dinosaur = pending.pop(future)
+            try:
+                response = future.result()
+            except Exception as err:
+                # No answer to report, like a transport error or a StepTimeout: status 0 and the error's text
+                report.failures.append(SeedFailure(index, dinosaur, 0, str(err) or type(err).__name__))
+                continue
+            if response.status_code != Status.OK.value:
+                report.failures.append(_seed_failure(index, dinosaur, response))
+
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=in_flight, thread_name_prefix="seed") as executor:
+        try:
+            for index, dinosaur in enumerate(dinosaurs):
+                if len(pending) >= in_flight:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+                body = json.dumps(dinosaur.to_dict(), separators=(",", ":")).encode()
+                future = executor.submit(
+                    copy_context().run, send_request, "POST", DINOSAURS_ENDPOINT, content=body
+                )
+                pending[future] = (index, dinosaur)
+                report.sent += 1
+            collect(wait(pending).done)
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+    report.elapsed = perf_counter() - start
+    report.failures.sort(key=lambda failure: failure.index)
+    return report
+
+
 def get_dinosaur_by_name(
     dinosaur_name: str,
     expected_response: GetDinosaurByNameResponses,
     expected_status: Status = Status.OK,
 ) -> None:
-    response = CLIENT.get(f"{DINOSAURS_ENDPOINT}/{dinosaur_name}")
+    verify_response(
+        send_request("GET", f"{DINOSAURS_ENDPOINT}/{dinosaur_name}", route=f"{DINOSAURS_ENDPOINT}/{{name}}"),
+        _check_get_dinosaur_by_name,
+        dinosaur_name,
+        expected_response,
+        expected_status,
+    )
+
 
+def _check_get_dinosaur_by_name(
+    response: Response,
+    dinosaur_name: str,
+    expected_response: GetDinosaurByNameResponses,
+    expected_status: Status,
+) -> None:
     assert expected_status.value == response.status_code, (
         f"GET '/dinosaurs/{dinosaur_name}': Invalid status code {pformat(expected_status, sort_dicts=False)}"
         f" != {pformat(response.status_code, sort_dicts=False)}"
     )
-    assert expected_response.to_dict() == response.json(), (
-        f"GET '/dinosaurs/{dinosaur_name}': Invalid"
-        f" payload\nExpected:\n{pformat(expected_response.to_dict(), sort_dicts=False)}\n !="
-        f" {pformat(response.json(), sort_dicts=False)}"
+    expected_payload, received = expected_response.to_dict(), response.json()
+    assert expected_payload == received, render_diff(
+        f"GET '/dinosaurs/{dinosaur_name}': Invalid payload", expected_payload, received
     )
 
 
 def get_dinosaurs(expected_response: GetDinosaursResponse, expected_status: Status = Status.OK) -> None:
-    response = CLIENT.get(DINOSAURS_ENDPOINT)
+    if len(expected_response) >= STREAMING_THRESHOLD:
+        stream_dinosaurs(expected_response, expected_status)
+        return
+    verify_response(
+        send_request("GET", DINOSAURS_ENDPOINT), _check_get_dinosaurs, expected_response, expected_status
+    )
+
+
+def stream_dinosaurs(expected_response: Iterable[Dinosaurs], expected_status: Status = Status.OK) -> None:
+    with _stream_request("GET", DINOSAURS_ENDPOINT) as response:
+        verify_response(response, _check_streamed_dinosaurs, expected_response, expected_status)
+
 
+def _check_streamed_dinosaurs(
+    response: Response, expected_response: Iterable[Dinosaurs], expected_status: Status
+) -> None:
     assert expected_status.value == response.status_code, (
         f"GET '/dinosaurs': Invalid status code {pformat(expected_status, sort_dicts=False)}"
         f" != {pformat(response.status_code, sort_dicts=False)}"
     )
 
-    response_body = response.json()
-    expected_dict = [dino.to_dict() for dino in expected_response]
-    expected_dinos = [frozenset(dino.items()) for dino in expected_dict]
-    received_dinos = [frozenset(dino.items()) for dino in response_body]
-    assert len(expected_response) == len(response_body), (
-        f"GET '/dinosaurs': Invalid payload\nExpected:\n{pformat(expected_dict, sort_dicts=False)}\n "
-        f" !=\nRECEIVED\n{pformat(response_body, sort_dicts=False)}"
+    expected_dinos = iter(expected_response)
+    count = 0
+    for count, received in enumerate(iter_json_array(response.iter_bytes()), start=1):
+        expected = next(expected_dinos, None)
+        assert (
+            expected is not None
+        ), f"GET '/dinosaurs': Invalid payload\n  [{count - 1}]: unexpected {describe(received)}"
+        expected_dict = expected.to_dict()
+        assert expected_dict == received, render_diff(
+            "GET '/dinosaurs': Invalid payload", expected_dict, received, path=f"[{count - 1}]"
+        )
+    missing = next(expected_dinos, None)
+    assert (
+        missing is None
+    ), f"GET '/dinosaurs': Invalid payload\n  [{count}]: missing, expected {describe(missing.to_dict())}"
+
+
+def _check_get_dinosaurs(
+    response: Response, expected_response: GetDinosaursResponse, expected_status: Status
+) -> None:
+    assert expected_status.value == response.status_code, (
+        f"GET '/dinosaurs': Invalid status code {pformat(expected_status, sort_dicts=False)}"
+        f" != {pformat(response.status_code, sort_dicts=False)}"
     )
-    assert expected_dinos == received_dinos, (
-        f"GET '/dinosaurs': Invalid payload\nExpected:\n{pformat(expected_dict, sort_dicts=False)}\n "
-        f" !=\nRECEIVED\n{pformat(response_body, sort_dicts=False)}"
+
+    expected_payload = [dino.to_dict() for dino in expected_response]
+    received = response.json()
+    assert expected_payload == received, render_diff(
+        "GET '/dinosaurs': Invalid payload", expected_payload, received
     )
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+from collections.abc import Callable, Mapping, Sequence
+from dataclasses import dataclass
+from math import log
+from statistics import median
+
+from rich import print
+from rich.table import Table
+
+from .models import DinoCarnivore, DinoGender, DinoHerbivorous, Dinosaurs, PostResourcesRequest
+from .resources import (
+    DEFAULT_SEED_IN_FLIGHT,
+    Exchange,
+    add_request_observer,
+    get_dinosaurs,
+    get_resources,
+    post_reset,
+    post_resources,
+    post_turn,
+    remove_request_observer,
+    seed_dinosaurs,
+)
+from .simulator import ParkSimulator, burger_need, salad_need, water_need
+
+SCALE_WEIGHT = 100
+# Servers keep resource quantities in 32-bit ints
+MAX_QUANTITY = 2**31 - 1
+
+_CARNIVORES = sorted(DinoCarnivore, key=lambda species: species.value)
+_HERBIVORES = sorted(DinoHerbivorous, key=lambda species: species.value)
+
+
+class ScaleError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class ScaleReport:
+    sizes: tuple[int, ...]
+    latencies: Mapping[str, tuple[float, ...]]
+
+    def exponents(self) -> dict[str, float]:
+        tail = max(2, (len(self.sizes) + 1) // 2)
+        return {
+            endpoint: growth_exponent(self.sizes[-tail:], latencies[-tail:])
+            for endpoint, latencies in self.latencies.items()
+        }
+
+
+def parse_sizes(text: str) -> tuple[int, ...]:
+    sizes = tuple(int(size) for size in text.split(","))
+    if len(sizes) < 2 or any(size <= 0 for size in sizes) or list(sizes) != sorted(set(sizes)):
+        raise ValueError(f"expected at least two increasing positive sizes, got '{text}'")
+    return sizes
+
+
+def growth_exponent(sizes: Sequence[int], latencies: Sequence[float]) -> float:
+    xs = [log(size) for size in sizes]
+    ys = [log(max(latency, 1e-9)) for latency in latencies]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance
+
+
+def scale_dinosaur(index: int) -> Dinosaurs:
+    carnivore = index % 2 == 1
+    species = _CARNIVORES if carnivore else _HERBIVORES
+    return Dinosaurs(
+        name=f"Scale{index}",
+        weight=SCALE_WEIGHT + index,
+        gender=DinoGender.MALE if carnivore else DinoGender.FEMALE,
+        species=species[index // 2 % len(species)],
+    )
+
+
+def feeding_orders(quantities: Sequence[int]) -> list[PostResourcesRequest]:
+    """Orders adding up to the burger, salad and water quantities, none of them above `MAX_QUANTITY`."""
+    orders = []
+    remaining = list(quantities)
+    while any(remaining):
+        order = [min(quantity, MAX_QUANTITY) for quantity in remaining]
+        orders.append(PostResourcesRequest(*order))
+        remaining = [quantity - ordered for quantity, ordered in zip(remaining, order)]
+    return orders
+
+
+def run_scale(sizes: Sequence[int], repeats: int = 3, in_flight: int = DEFAULT_SEED_IN_FLIGHT) -> ScaleReport:
+    park = ParkSimulator()
+    exchanges: list[Exchange] = []
+    latencies: dict[str, list[float]] = {"POST /turn": [], "GET /dinosaurs": [], "GET /resources": []}
+
+    def timed(endpoint: str, call: Callable[[], None]) -> None:
+        samples = []
+        for _ in range(repeats):
+            call()
+            samples.append(exchanges[-1].elapsed)
+        latencies[endpoint].append(median(samples))
+
+    def turn() -> None:
+        for feeding in feeding_orders([2 * need for need in needs]):
+            post_resources(request_payload=feeding)
+            park.add_resources(feeding)
+        post_turn(expected_response=park.turn())
+
+    needs = [0, 0, 0]
+    post_reset()
+    add_request_observer(exchanges.append, needs_body=False)
+    try:
+        seeded = 0
+        for size in sizes:
+            newcomers = [scale_dinosaur(index) for index in range(seeded, size)]
+            park.add_dinosaurs(newcomers)
+            for dinosaur in newcomers:
+                if dinosaur.species in DinoCarnivore:
+                    needs[0] += burger_need(dinosaur.weight)
+                else:
+                    needs[1] += salad_need(dinosaur.weight)
+                needs[2] += water_need(dinosaur.weight)
+            seeding = seed_dinosaurs(newcomers, in_flight)
+            if seeding.failures:
+                raise ScaleError(
+                    f"Seeding rejected {len(seeding.failures)} dinosaurs, first {seeding.failures[0]}"
+                )
+            seeded = size
+            try:
+                timed("POST /turn", turn)
+                timed("GET /dinosaurs", lambda: get_dinosaurs(expected_response=park.dinosaurs()))
+                timed("GET /resources", lambda: get_resources(expected_response=park.resources()))
+            except AssertionError as err:
+                raise ScaleError(f"With {size} dinosaurs: {err}") from None
+            print(f" - {size:>7} dinosaurs: {seeding.summary()}")
+    finally:
+        remove_request_observer(exchanges.append)
+    return ScaleReport(tuple(sizes), {endpoint: tuple(values) for endpoint, values in latencies.items()})
+
+
+def print_scale_report(report: ScaleReport, max_exponent: float) -> None:
+    table = Table(title="Median latency by population (ms)")
+    table.add_column("Dinosaurs", justify="right")
+    for endpoint in report.latencies:
+        table.add_column(endpoint, justify="right")
+    for index, size in enumerate(report.sizes):
+        table.add_row(
+            str(size), *(f"{latencies[index] * 1000:.2f}" for latencies in report.latencies.values())
+        )
+    table.add_row(
+        "exponent",
+        *(
+            f"[{'red' if exponent > max_exponent else 'green'}]{exponent:.2f}"
+            for exponent in report.exponents().values()
+        ),
+    )
+    print(table)
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import multiprocessing
+from collections.abc import Collection, Sequence
+from dataclasses import replace
+from pathlib import Path
+from typing import Any
+
+from rich import print
+
+from .clients import INPROC_TARGET, ClientConfig, client_config, configure_clients
+from .resources import (
+    Exchange,
+    add_request_observer,
+    clear_request_observers,
+    has_request_observers,
+    notify_request_observers,
+    set_deferred_verification,
+    set_time_budgets,
+    time_budgets,
+)
+from .tests import (
+    ServerHealth,
+    StoryResult,
+    clear_story_observers,
+    notify_story_observers,
+    print_story_result,
+    registered_test_stories,
+    run_test_story,
+    select_test_story_indices,
+)
+
+_captured: list[Exchange] | None = None
+
+
+def assign_shard_targets(targets: Sequence[str], workers: int | None) -> list[str]:
+    if workers is None:
+        return list(targets)
+    if list(targets) == [INPROC_TARGET]:
+        return [INPROC_TARGET] * workers
+    if workers > len(targets):
+        raise ValueError(f"{workers} workers need as many shard targets, got {len(targets)}")
+    return list(targets[:workers])
+
+
+def restore_test_stories(story_files: Sequence[Path], generated: tuple[int, int], story_count: int) -> None:
+    """Registers again, in the parent's order, the stories a spawned (not forked) worker does not inherit."""
+    if len(registered_test_stories()) >= story_count:
+        return
+    if story_files:
+        from .story_files import register_story_files
+
+        register_story_files(story_files)
+    seed, count = generated
+    if count:
+        from .combinatorial import register_generated_stories
+
+        register_generated_stories(seed, count)
+
+
+def _start_worker(
+    targets: Any,
+    config: ClientConfig,
+    pipeline: bool,
+    capture: bool,
+    capture_bodies: bool,
+    story_files: Sequence[Path],
+    generated: tuple[int, int],
+    story_count: int,
+    time_budgets: tuple[float | None, float | None],
+) -> None:
+    global _captured
+    restore_test_stories(story_files, generated, story_count)
+    configure_clients(replace(config, target=targets.get()))
+    set_deferred_verification(pipeline)
+    set_time_budgets(*time_budgets)
+    # Observers inherited through fork belong to the parent, which gets the results and exchanges back
+    clear_request_observers()
+    clear_story_observers()
+    if capture:
+        _captured = []
+        add_request_observer(_captured.append, needs_body=capture_bodies)
+
+
+def _run_story_index(index: int) -> tuple[StoryResult, list[Exchange]]:
+    result = run_test_story(registered_test_stories()[index])
+    if _captured is None:
+        return result, []
+    exchanges = list(_captured)
+    _captured.clear()
+    return result, exchanges
+
+
+def run_test_stories_on_shards(
+    stories: Collection[int] | None,
+    targets: Sequence[str],
+    pipeline: bool = False,
+    story_files: Sequence[Path] = (),
+    generated: tuple[int, int] = (0, 0),
+) -> list[StoryResult]:
+    """`generated` is the (seed, count) of the generated stories, registered again by spawned workers."""
+    indices = select_test_story_indices(stories)
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    pending_targets = context.SimpleQueue()
+    for target in targets:
+        pending_targets.put(target)
+    results = []
+    health = ServerHealth()
+    print("Run tests")
+    with context.Pool(
+        processes=len(targets),
+        initializer=_start_worker,
+        initargs=(
+            pending_targets,
+            client_config(),
+            pipeline,
+            has_request_observers(),
+            has_request_observers(needs_body=True),
+            list(story_files),
+            generated,
+            len(registered_test_stories()),
+            time_budgets(),
+        ),
+    ) as pool:
+        for result, exchanges in pool.imap(_run_story_index, indices):
+            for exchange in exchanges:
+                notify_request_observers(exchange)
+            notify_story_observers(result)
+            results.append(result)
+            print_story_result(result)
+            health.record(result)
+            if not health.healthy:
+                break
+    for index in indices[len(results) :]:
+        results.append(health.skipped(registered_test_stories()[index]))
+        print_story_result(results[-1])
+    return results
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import heapq
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+from .models import (
+    DinoCarnivore,
+    DinoGender,
+    DinoHerbivorous,
+    Dinosaurs,
+    DuplicateNameError,
+    GetDinosaurByNameResponses,
+    GetResourcesResponse,
+    InvalidGenderError,
+    InvalidSpeciesError,
+    InvalidWeightError,
+    NonExistentNameError,
+    PostDinosaursResponses,
+    PostResourcesInvalidResourceQuantityError,
+    PostResourcesRequest,
+    PostResourcesResponses,
+    PostTurnResponse,
+    Resource,
+)
+
+TURN_BURGERS = 100
+TURN_SALADS = 250
+TURN_WATER = 10000
+
+BURGER_LIFETIME = 4
+SALAD_LIFETIME = 3
+WATER_LIFETIME = 10
+
+
+def burger_need(weight: int) -> int:
+    return -(-weight // 1000)
+
+
+def salad_need(weight: int) -> int:
+    return -(-weight // 400)
+
+
+def water_need(weight: int) -> int:
+    return -(-weight * 3 // 5)
+
+
+class _Stock:
+    """Batches by arrival turn. Delivered orders are eaten first, then the park's production oldest first.
+
+    As in the reference server, when a meal empties a batch and only partly eats the next one, what is left of that
+    batch stays fresh: it never expires and is only eaten once every batch is empty.
+    """
+
+    __slots__ = ("lifetime", "batches", "kept", "fresh", "expired", "consumed")
+
+    def __init__(self, lifetime: int) -> None:
+        self.lifetime = lifetime
+        self.batches: deque[list[int]] = deque()
+        self.kept = 0
+        self.fresh = 0
+        self.expired = 0
+        self.consumed = 0
+
+    def add(self, turn: int, quantity: int) -> None:
+        if quantity <= 0:
+            return
+        if self.batches and self.batches[-1][0] == turn:
+            self.batches[-1][1] += quantity
+        else:
+            self.batches.append([turn, quantity])
+        self.fresh += quantity
+
+    def deliver(self, turn: int, quantity: int) -> None:
+        """Ordered resources arrive as their own batch, eaten before the park's production."""
+        if quantity > 0:
+            self.batches.appendleft([turn, quantity])
+            self.fresh += quantity
+
+    def expire(self, turn: int) -> None:
+        if not any(batch[0] + self.lifetime <= turn for batch in self.batches):
+            return
+        remaining: deque[list[int]] = deque()
+        for batch in self.batches:
+            if batch[0] + self.lifetime <= turn:
+                self.fresh -= batch[1]
+                self.expired += batch[1]
+            else:
+                remaining.append(batch)
+        self.batches = remaining
+
+    def consume(self, quantity: int) -> None:
+        quantity = min(quantity, self.fresh)
+        self.fresh -= quantity
+        self.consumed += quantity
+        batches = self.batches
+        emptied = False
+        while quantity and batches:
+            batch = batches[0]
+            if batch[1] > quantity:
+                batch[1] -= quantity
+                if emptied:
+                    self.kept += batches.popleft()[1]
+                return
+            quantity -= batch[1]
+            batches.popleft()
+            emptied = True
+        self.kept -= quantity
+
+
+@dataclass
+class _Resident:
+    __slots__ = ("dinosaur", "sort_key", "carnivore", "food", "water", "newcomer")
+
+    dinosaur: Dinosaurs
+    sort_key: tuple[float, int]
+    carnivore: bool
+    food: int
+    water: int
+    newcomer: bool
+
+
+class ParkSimulator:
+    """Reference model of the park, answering each endpoint with the `models` dataclasses."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.turn_number = 0
+        self._burgers = _Stock(BURGER_LIFETIME)
+        self._salads = _Stock(SALAD_LIFETIME)
+        self._water = _Stock(WATER_LIFETIME)
+        self._ordered = [0, 0, 0]
+        self._pending: list[Dinosaurs] = []
+        self._residents: list[_Resident] = []
+        self._newcomers: list[_Resident] = []
+        self._by_name: dict[str, _Resident] = {}
+        self._pending_names: set[str] = set()
+        self._arrivals = 0
+        self._needs = [0, 0, 0]
+
+    def turn(self) -> PostTurnResponse:
+        self.turn_number += 1
+        turn = self.turn_number
+        burgers, salads, water = self._ordered
+        self._ordered = [0, 0, 0]
+        for stock, production, ordered in (
+            (self._burgers, TURN_BURGERS, burgers),
+            (self._salads, TURN_SALADS, salads),
+            (self._water, TURN_WATER, water),
+        ):
+            stock.expire(turn)
+            stock.add(turn, production)
+            stock.deliver(turn, ordered)
+        self._admit_pending()
+        self._feed()
+        return PostTurnResponse(turnNumber=turn)
+
+    def add_resources(self, request: PostResourcesRequest) -> PostResourcesResponses:
+        quantities = [request.qtyBurger or 0, request.qtySalad or 0, request.qtyWater or 0]
+        if any(quantity < 0 for quantity in quantities):
+            return PostResourcesInvalidResourceQuantityError()
+        self._ordered = [ordered + quantity for ordered, quantity in zip(self._ordered, quantities)]
+        return None
+
+    def add_dinosaur(self, dinosaur: Dinosaurs) -> PostDinosaursResponses:
+        if dinosaur.gender not in (DinoGender.MALE, DinoGender.FEMALE):
+            return InvalidGenderError()
+        if dinosaur.weight <= 0:
+            return InvalidWeightError()
+        if dinosaur.species not in DinoCarnivore and dinosaur.species not in DinoHerbivorous:
+            return InvalidSpeciesError()
+        if dinosaur.name in self._by_name or dinosaur.name in self._pending_names:
+            return DuplicateNameError()
+        self._pending.append(dinosaur)
+        self._pending_names.add(dinosaur.name)
+        return None
+
+    def add_dinosaurs(self, dinosaurs: Iterable[Dinosaurs]) -> list[PostDinosaursResponses]:
+        return [self.add_dinosaur(dinosaur) for dinosaur in dinosaurs]
+
+    def resources(self) -> GetResourcesResponse:
+        stocks = (self._burgers, self._salads, self._water)
+        return GetResourcesResponse(
+            fresh=Resource(*(stock.fresh for stock in stocks)),
+            expired=Resource(*(stock.expired for stock in stocks)),
+            consumed=Resource(*(stock.consumed for stock in stocks)),
+        )
+
+    def dinosaurs(self) -> list[Dinosaurs]:
+        return [resident.dinosaur for resident in self._residents]
+
+    def dinosaur(self, name: str) -> GetDinosaurByNameResponses:
+        resident = self._by_name.get(name)
+        return NonExistentNameError() if resident is None else resident.dinosaur
+
+    def _admit_pending(self) -> None:
+        if not self._pending:
+            return
+        newcomers = []
+        for dinosaur in self._pending:
+            carnivore = dinosaur.species in DinoCarnivore
+            weight = dinosaur.weight
+            resident = _Resident(
+                dinosaur=dinosaur,
+                sort_key=(-dinosaur.force(), self._arrivals),
+                carnivore=carnivore,
+                food=burger_need(weight) if carnivore else salad_need(weight),
+                water=water_need(weight),
+                newcomer=True,
+            )
+            self._arrivals += 1
+            self._needs[0 if carnivore else 1] += resident.food
+            self._needs[2] += resident.water
+            self._by_name[dinosaur.name] = resident
+            newcomers.append(resident)
+        newcomers.sort(key=lambda resident: resident.sort_key)
+        self._residents = list(
+            heapq.merge(self._residents, newcomers, key=lambda resident: resident.sort_key)
+        )
+        self._pending = []
+        self._pending_names = set()
+        self._newcomers = newcomers
+
+    def _feed(self) -> None:
+        newcomers = self._newcomers
+        needs = list(self._needs)
+        for resident in newcomers:
+            needs[0 if resident.carnivore else 1] += resident.food
+            needs[2] += resident.water
+        starving = (
+            needs[0] > self._burgers.fresh or needs[1] > self._salads.fresh or needs[2] > self._water.fresh
+        )
+        if starving:
+            survivors = self._survivors(needs)
+        self._burgers.consume(needs[0])
+        self._salads.consume(needs[1])
+        self._water.consume(needs[2])
+        for resident in newcomers:
+            resident.newcomer = False
+        self._newcomers = []
+        if starving:
+            for resident in self._residents:
+                if resident.dinosaur.name not in survivors:
+                    self._needs[0 if resident.carnivore else 1] -= resident.food
+                    self._needs[2] -= resident.water
+                    del self._by_name[resident.dinosaur.name]
+            self._residents = [
+                resident for resident in self._residents if resident.dinosaur.name in survivors
+            ]
+
+    def _survivors(self, needs: list[int]) -> set[str]:
+        available = [self._burgers.fresh, self._salads.fresh, self._water.fresh]
+        survivors = set()
+        for resident in self._residents:
+            factor = 2 if resident.newcomer else 1
+            food_stock = 0 if resident.carnivore else 1
+            fed = True
+            for stock, need in ((food_stock, resident.food * factor), (2, resident.water * factor)):
+                if available[stock] >= need:
+                    available[stock] -= need
+                else:
+                    available[stock] = 0
+                    fed = False
+            if fed:
+                survivors.add(resident.dinosaur.name)
+        return survivors
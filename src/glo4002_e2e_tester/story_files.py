@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+from .diff import render_diff
+from .models import (
+    DinoGender,
+    Dinosaurs,
+    DinoSpecies,
+    GetResourcesResponse,
+    PostTurnResponse,
+    Resource,
+)
+from .resources import (
+    DINOSAURS_ENDPOINT,
+    HEARTBEAT_ENDPOINT,
+    RESET_ENDPOINT,
+    RESOURCE_ENDPOINT,
+    TURN_ENDPOINT,
+    Status,
+    send_request,
+    verify_response,
+)
+from .tests import DuplicateStoryError, TestStory, register_test_story_builder
+
+PLAN_FORMAT_VERSION = 2
+STORY_FILE_SUFFIXES = (".json", ".yaml", ".yml")
+
+
+class StoryFileError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class CompiledStep:
+    method: str
+    path: str
+    route: str
+    body: bytes | None
+    status: int
+    expected: Any = None
+
+
+@dataclass(frozen=True)
+class StoryPlan:
+    name: str
+    steps: tuple[CompiledStep, ...]
+
+
+def _dinosaur(payload: Mapping[str, Any]) -> Dinosaurs:
+    return Dinosaurs(
+        name=payload["name"],
+        weight=payload["weight"],
+        gender=DinoGender(payload["gender"]),
+        species=DinoSpecies(payload["species"]),
+    )
+
+
+def _resources(payload: Mapping[str, Any]) -> GetResourcesResponse:
+    return GetResourcesResponse(
+        fresh=Resource(**payload["fresh"]),
+        expired=Resource(**payload["expired"]),
+        consumed=Resource(**payload["consumed"]),
+    )
+
+
+_ACTIONS: Mapping[str, tuple[str, str, Callable[[Any], Any] | None]] = {
+    "heartbeat": ("GET", HEARTBEAT_ENDPOINT, None),
+    "reset": ("POST", RESET_ENDPOINT, None),
+    "turn": ("POST", TURN_ENDPOINT, lambda expect: asdict(PostTurnResponse(**expect))),
+    "post_resources": ("POST", RESOURCE_ENDPOINT, lambda expect: expect),
+    "get_resources": ("GET", RESOURCE_ENDPOINT, lambda expect: asdict(_resources(expect))),
+    "post_dinosaurs": ("POST", DINOSAURS_ENDPOINT, lambda expect: expect),
+    "get_dinosaurs": (
+        "GET",
+        DINOSAURS_ENDPOINT,
+        lambda expect: [_dinosaur(dino).to_dict() for dino in expect],
+    ),
+    "get_dinosaur": ("GET", DINOSAURS_ENDPOINT, lambda expect: expect),
+}
+
+
+def _compile_step(index: int, step: Any) -> CompiledStep:
+    spec: Mapping[str, Any]
+    if isinstance(step, str):
+        action, spec = step, {}
+    elif isinstance(step, Mapping) and len(step) == 1:
+        action, spec = next(iter(step.items()))
+        spec = spec or {}
+    else:
+        raise StoryFileError(f"step {index}: expected an action name or a single-key mapping")
+    if action not in _ACTIONS:
+        raise StoryFileError(
+            f"step {index}: unknown action '{action}', expected one of {', '.join(_ACTIONS)}"
+        )
+    if not isinstance(spec, Mapping):
+        raise StoryFileError(f"step {index} ({action}): expected a mapping, got {spec!r}")
+    method, path, build_expected = _ACTIONS[action]
+    route = path
+    if action == "get_dinosaur":
+        if "name" not in spec:
+            raise StoryFileError(f"step {index} ({action}): missing the dinosaur 'name'")
+        path = f"{DINOSAURS_ENDPOINT}/{spec['name']}"
+        route = f"{DINOSAURS_ENDPOINT}/{{name}}"
+    expect = spec.get("expect")
+    try:
+        expected = None if expect is None or build_expected is None else build_expected(expect)
+    except (AssertionError, KeyError, TypeError, ValueError) as err:
+        raise StoryFileError(f"step {index} ({action}): invalid expectation {expect!r}: {err}") from err
+    request = spec.get("request")
+    return CompiledStep(
+        method=method,
+        path=path,
+        route=route,
+        body=None if request is None else json.dumps(request).encode(),
+        status=spec.get("status", Status.OK.value),
+        expected=expected,
+    )
+
+
+def _parse(path: Path, content: bytes) -> Any:
+    if path.suffix == ".json":
+        try:
+            return json.loads(content)
+        except ValueError as err:
+            raise StoryFileError(f"{path}: invalid JSON: {err}") from None
+    try:
+        import yaml
+    except ImportError:
+        raise StoryFileError(
+            f"{path}: YAML stories require PyYAML, install glo4002-e2e-tester[yaml]"
+        ) from None
+    try:
+        return yaml.safe_load(content)
+    except yaml.YAMLError as err:
+        raise StoryFileError(f"{path}: invalid YAML: {err}") from None
+
+
+def compile_story(path: Path, content: bytes) -> StoryPlan:
+    document = _parse(path, content)
+    if isinstance(document, list):
+        document = {"steps": document}
+    if not isinstance(document, Mapping):
+        raise StoryFileError(f"{path}: expected a list of steps or a mapping with 'steps', got {document!r}")
+    steps = document.get("steps") or []
+    if not isinstance(steps, list):
+        raise StoryFileError(f"{path}: 'steps' must be a list, got {steps!r}")
+    try:
+        return StoryPlan(
+            name=str(document.get("name") or path.stem),
+            steps=tuple(_compile_step(index, step) for index, step in enumerate(steps, start=1)),
+        )
+    except StoryFileError as err:
+        raise StoryFileError(f"{path}: {err}") from None
+
+
+def plan_cache_dir() -> Path:
+    if "DINO_TEST_CACHE_DIR" in os.environ:
+        return Path(os.environ["DINO_TEST_CACHE_DIR"])
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "glo4002-e2e-tester" / "plans"
+
+
+def _dump_plan(plan: StoryPlan) -> str:
+    return json.dumps(
+        {
+            "name": plan.name,
+            "steps": [
+                {**asdict(step), "body": None if step.body is None else step.body.decode()}
+                for step in plan.steps
+            ],
+        }
+    )
+
+
+def _read_plan(text: str) -> StoryPlan:
+    payload = json.loads(text)
+    return StoryPlan(
+        name=payload["name"],
+        steps=tuple(
+            CompiledStep(**{**step, "body": None if step["body"] is None else step["body"].encode()})
+            for step in payload["steps"]
+        ),
+    )
+
+
+def load_story_plan(path: Path, cache_dir: Path | None = None) -> StoryPlan:
+    """Plans are cached as JSON, and recompiled whenever their cache entry cannot be read back."""
+    content = path.read_bytes()
+    digest = hashlib.sha256(content + f"\0{path.suffix}\0{PLAN_FORMAT_VERSION}".encode()).hexdigest()
+    cached = (cache_dir or plan_cache_dir()) / f"{digest}.json"
+    try:
+        return _read_plan(cached.read_text(encoding="utf-8"))
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        pass
+    plan = compile_story(path, content)
+    try:
+        text = _dump_plan(plan)
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        temporary = cached.with_suffix(f".{os.getpid()}.tmp")
+        temporary.write_text(text, encoding="utf-8")
+        temporary.replace(cached)
+    except (OSError, TypeError, ValueError):
+        # A YAML expectation that JSON cannot hold (a date, ...) leaves the plan uncached
+        pass
+    return plan
+
+
+def _check_compiled_step(response: Any, step: CompiledStep) -> None:
+    assert (
+        step.status == response.status_code
+    ), f"{step.method} '{step.path}': Invalid status code {step.status} != {response.status_code}"
+    if step.expected is not None:
+        received = response.json()
+        assert step.expected == received, render_diff(
+            f"{step.method} '{step.path}': Invalid payload", step.expected, received
+        )
+
+
+def run_story_plan(plan: StoryPlan) -> None:
+    for step in plan.steps:
+        verify_response(
+            send_request(step.method, step.path, route=step.route, content=step.body),
+            _check_compiled_step,
+            step,
+        )
+
+
+def story_from_plan(plan: StoryPlan) -> TestStory:
+    def run_plan() -> None:
+        run_story_plan(plan)
+
+    run_plan.__name__ = plan.name
+    run_plan.__qualname__ = plan.name
+    return run_plan
+
+
+def iter_story_files(paths: Iterable[Path]) -> Iterator[Path]:
+    for path in paths:
+        if path.is_dir():
+            yield from sorted(child for child in path.iterdir() if child.suffix in STORY_FILE_SUFFIXES)
+        else:
+            yield path
+
+
+def register_story_files(paths: Iterable[Path]) -> None:
+    for path in iter_story_files(paths):
+        try:
+            register_test_story_builder(
+                story_from_plan(load_story_plan(path)), str(path.resolve()), unique=True
+            )
+        except DuplicateStoryError as err:
+            raise StoryFileError(f"{path}: {err}") from None
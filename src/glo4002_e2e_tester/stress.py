@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import json
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from dataclasses import asdict, dataclass, field, replace
+from functools import partial
+from threading import Barrier
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+from rich import print
+from rich.table import Table
+
+from .clients import client_config, open_client
+from .histogram import LatencyHistogram
+from .models import (
+    DinoCarnivore,
+    Dinosaurs,
+    DuplicateNameError,
+    PostResourcesRequest,
+    PostTurnResponse,
+)
+from .resources import (
+    DINOSAURS_ENDPOINT,
+    RESOURCE_ENDPOINT,
+    TURN_ENDPOINT,
+    Status,
+    get_dinosaurs,
+    get_resources,
+    post_reset,
+    post_resources,
+    post_turn,
+    send_request,
+    use_client,
+)
+from .scaling import scale_dinosaur
+from .simulator import (
+    TURN_BURGERS,
+    TURN_SALADS,
+    TURN_WATER,
+    ParkSimulator,
+    burger_need,
+    salad_need,
+    water_need,
+)
+
+if TYPE_CHECKING:
+    from httpx import Response
+
+MAX_REPORTED_VIOLATIONS = 20
+RACING_ORDER = PostResourcesRequest(qtyBurger=3, qtySalad=5, qtyWater=7)
+
+
+@dataclass(frozen=True)
+class Violation:
+    scenario: str
+    burst: int
+    message: str
+
+
+@dataclass
+class ScenarioStats:
+    bursts: int = 0
+    requests: int = 0
+    elapsed: float = 0.0
+    latencies: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+
+@dataclass
+class StressReport:
+    concurrency: int
+    scenarios: dict[str, ScenarioStats] = field(default_factory=dict)
+    violations: list[Violation] = field(default_factory=list)
+
+
+class _Burst:
+    """Releases every request of a burst at once from its own thread, to make them collide on the server."""
+
+    def __init__(self, executor: ThreadPoolExecutor, stats: ScenarioStats) -> None:
+        self.executor = executor
+        self.stats = stats
+
+    def fire(self, calls: Sequence[Callable[[], Response]]) -> list[Response | Exception]:
+        barrier = Barrier(len(calls))
+
+        def timed(call: Callable[[], Response]) -> tuple[Response | Exception, float]:
+            barrier.wait()
+            start = perf_counter()
+            try:
+                return call(), perf_counter() - start
+            except Exception as err:
+                return err, perf_counter() - start
+
+        start = perf_counter()
+        futures = [self.executor.submit(copy_context().run, timed, call) for call in calls]
+        outcomes = [future.result() for future in futures]
+        self.stats.elapsed += perf_counter() - start
+        self.stats.bursts += 1
+        self.stats.requests += len(calls)
+        for _, latency in outcomes:
+            self.stats.latencies.record(latency)
+        return [outcome for outcome, _ in outcomes]
+
+
+def _status(outcome: Response | Exception) -> str:
+    if isinstance(outcome, Exception):
+        return type(outcome).__name__
+    return str(outcome.status_code)
+
+
+def _is_ok(outcome: Response | Exception) -> bool:
+    return not isinstance(outcome, Exception) and outcome.status_code == Status.OK.value
+
+
+def _turn_number(response: Response) -> int | None:
+    try:
+        number = response.json()["turnNumber"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    return number if isinstance(number, int) else None
+
+
+def _error_code(outcome: Response | Exception) -> Any:
+    if isinstance(outcome, Exception) or outcome.status_code != Status.BAD_REQUEST.value:
+        return None
+    try:
+        return outcome.json().get("error")
+    except (ValueError, AttributeError):
+        return None
+
+
+def _check(violations: list[str], check: Callable[[], None]) -> None:
+    try:
+        check()
+    except AssertionError as err:
+        violations.append(str(err))
+
+
+def _check_park(violations: list[str], park: ParkSimulator) -> None:
+    _check(violations, lambda: get_dinosaurs(expected_response=park.dinosaurs()))
+    _check(violations, lambda: get_resources(expected_response=park.resources()))
+
+
+def _body(dinosaur: Dinosaurs) -> bytes:
+    return json.dumps(dinosaur.to_dict()).encode()
+
+
+def duplicate_name(burst: _Burst, index: int, concurrency: int) -> list[str]:
+    """Identical POST /dinosaurs: exactly one is accepted, the others are DuplicateNameError."""
+    violations: list[str] = []
+    dinosaur = replace(scale_dinosaur(index), name=f"Twin{index}")
+    post_reset()
+    post = partial(send_request, "POST", DINOSAURS_ENDPOINT, content=_body(dinosaur))
+    outcomes = burst.fire([post] * concurrency)
+    accepted = sum(1 for outcome in outcomes if _is_ok(outcome))
+    duplicates = sum(1 for outcome in outcomes if _error_code(outcome) == DuplicateNameError.error)
+    if accepted != 1:
+        violations.append(
+            f"{accepted} of {concurrency} concurrent POST /dinosaurs of {dinosaur.name} accepted"
+        )
+    if accepted + duplicates != concurrency:
+        violations.append(
+            f"{concurrency - accepted - duplicates} answers were neither OK nor {DuplicateNameError.error}: "
+            + ", ".join(sorted({_status(outcome) for outcome in outcomes}))
+        )
+    park = ParkSimulator()
+    park.add_dinosaur(dinosaur)
+    _check(violations, lambda: post_turn(expected_response=park.turn()))
+    _check_park(violations, park)
+    return violations
+
+
+def distinct_names(burst: _Burst, index: int, concurrency: int) -> list[str]:
+    """Concurrent POST /dinosaurs of distinct dinosaurs: all are admitted once, in force order, and fed."""
+    violations: list[str] = []
+    dinosaurs = [
+        replace(scale_dinosaur(position), name=f"Crowd{index}_{position}") for position in range(concurrency)
+    ]
+    needs = [0, 0, 0]
+    for dinosaur in dinosaurs:
+        if dinosaur.species in DinoCarnivore:
+            needs[0] += burger_need(dinosaur.weight)
+        else:
+            needs[1] += salad_need(dinosaur.weight)
+        needs[2] += water_need(dinosaur.weight)
+    feeding = PostResourcesRequest(*(2 * need for need in needs))
+    park = ParkSimulator()
+    post_reset()
+    post_resources(request_payload=feeding)
+    park.add_resources(feeding)
+    outcomes = burst.fire(
+        [partial(send_request, "POST", DINOSAURS_ENDPOINT, content=_body(dino)) for dino in dinosaurs]
+    )
+    rejected = [
+        f"{dinosaur.name} ({_status(outcome)})"
+        for dinosaur, outcome in zip(dinosaurs, outcomes)
+        if not _is_ok(outcome)
+    ]
+    if rejected:
+        violations.append(f"{len(rejected)} distinct dinosaurs rejected: {', '.join(rejected[:5])}")
+    park.add_dinosaurs(dinosaurs)
+    _check(violations, lambda: post_turn(expected_response=park.turn()))
+    _check_park(violations, park)
+    return violations
+
+
+def resources_vs_turn(burst: _Burst, index: int, concurrency: int) -> list[str]:
+    """POST /resources racing POST /turn: turn numbers stay unique and no ordered resource is lost."""
+    violations: list[str] = []
+    turns = concurrency // 2
+    orders = concurrency - turns
+    post_reset()
+    turn = partial(send_request, "POST", TURN_ENDPOINT)
+    order = partial(send_request, "POST", RESOURCE_ENDPOINT, json=asdict(RACING_ORDER))
+    calls = [turn] * turns + [order] * orders
+    outcomes = burst.fire(calls)
+    numbers = sorted(
+        number
+        for call, outcome in zip(calls, outcomes)
+        if call is turn
+        and not isinstance(outcome, Exception)
+        and _is_ok(outcome)
+        and (number := _turn_number(outcome)) is not None
+    )
+    if numbers != list(range(1, turns + 1)):
+        violations.append(f"{turns} concurrent turns answered turn numbers {numbers}")
+    failed_orders = sum(1 for call, outcome in zip(calls, outcomes) if call is order and not _is_ok(outcome))
+    if failed_orders:
+        violations.append(f"{failed_orders} of {orders} concurrent POST /resources failed")
+    _check(violations, lambda: post_turn(expected_response=PostTurnResponse(turnNumber=turns + 1)))
+    response = send_request("GET", RESOURCE_ENDPOINT)
+    for key, per_turn, ordered in (
+        ("qtyBurger", TURN_BURGERS, RACING_ORDER.qtyBurger),
+        ("qtySalad", TURN_SALADS, RACING_ORDER.qtySalad),
+        ("qtyWater", TURN_WATER, RACING_ORDER.qtyWater),
+    ):
+        try:
+            delivered = sum(response.json()[state][key] for state in ("fresh", "expired", "consumed"))
+        except (ValueError, KeyError, TypeError):
+            violations.append(f"GET '/resources': unreadable payload {response.text[:80]!r}")
+            break
+        expected = per_turn * (turns + 1) + (ordered or 0) * (orders - failed_orders)
+        if delivered != expected:
+            violations.append(f"{key}: {delivered} fresh, expired and consumed, expected {expected}")
+    return violations
+
+
+STRESS_SCENARIOS: dict[str, Callable[[_Burst, int, int], list[str]]] = {
+    "duplicate-name": duplicate_name,
+    "distinct-names": distinct_names,
+    "resources-vs-turn": resources_vs_turn,
+}
+
+
+def run_stress(scenarios: Sequence[str], bursts: int, concurrency: int) -> StressReport:
+    report = StressReport(concurrency)
+    with open_client(client_config().target, max_connections=concurrency) as client, use_client(client):
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="stress") as executor:
+            for name in scenarios:
+                stats = report.scenarios[name] = ScenarioStats()
+                burst = _Burst(executor, stats)
+                for index in range(bursts):
+                    for message in STRESS_SCENARIOS[name](burst, index, concurrency):
+                        report.violations.append(Violation(name, index, message))
+    return report
+
+
+def _millis(seconds: float) -> str:
+    return f"{seconds * 1000:.2f}"
+
+
+def print_stress_report(report: StressReport) -> None:
+    table = Table(title=f"Bursts of {report.concurrency} conflicting requests (latency in ms)")
+    for index, column in enumerate(
+        ("Scenario", "Bursts", "Requests", "Req/s", "p50", "p99", "Max", "Violations")
+    ):
+        table.add_column(column, justify="left" if index == 0 else "right")
+    for name, stats in report.scenarios.items():
+        violations = sum(1 for violation in report.violations if violation.scenario == name)
+        table.add_row(
+            name,
+            str(stats.bursts),
+            str(stats.requests),
+            f"{stats.requests_per_second:.0f}",
+            _millis(stats.latencies.percentile(50)),
+            _millis(stats.latencies.percentile(99)),
+            _millis(stats.latencies.percentile(100)),
+            f"[{'red' if violations else 'green'}]{violations}",
+        )
+    print(table)
+    for violation in report.violations[:MAX_REPORTED_VIOLATIONS]:
+        print(f" - [red]{violation.scenario}[/red] burst {violation.burst}: {violation.message}")
+    if len(report.violations) > MAX_REPORTED_VIOLATIONS:
+        print(f" ... {len(report.violations) - MAX_REPORTED_VIOLATIONS} more violations")
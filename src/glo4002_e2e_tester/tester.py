@@ -1,17 +1,705 @@
 from __future__ import annotations
 
-from collections.abc import Collection
+from collections.abc import Collection, Sequence
+from pathlib import Path
 
 import click
 
-from .tests import list_test_stories, run_test_stories
 
-
-@click.command()
+@click.group(invoke_without_command=True)
 @click.option("--story", "-s", help="Story to run", type=int, multiple=True)
 @click.option("--list-stories", "-l", help="List Registered Stories", is_flag=True)
-def main(story: Collection[int] | None, list_stories: bool = False) -> None:
+@click.option(
+    "--target",
+    "-t",
+    help="Server base URL or `inproc`, repeat to spread stories across several instances",
+    multiple=True,
+    envvar="DINO_TEST_TARGET",
+)
+@click.option(
+    "--story-file",
+    "-f",
+    help="Register a JSON/YAML story file, or every story file of a directory",
+    multiple=True,
+    type=click.Path(exists=True, path_type=Path),
+)
+@click.option(
+    "--generate",
+    help="Register this many stories generated from the species, gender and boundary weight matrix",
+    type=click.IntRange(min=0),
+    default=0,
+    envvar="DINO_TEST_GENERATE",
+)
+@click.option(
+    "--generate-seed",
+    help="Seed of the generated stories' turns, orders and companions",
+    type=int,
+    default=0,
+    show_default=True,
+    envvar="DINO_TEST_GENERATE_SEED",
+)
+@click.option("--timings", help="Print slowest steps and per-endpoint timings", is_flag=True)
+@click.option(
+    "--record",
+    help="Record every request and response, gzipped if it ends with .gz",
+    type=click.Path(path_type=Path),
+)
+@click.option(
+    "--trace-out",
+    help="Write every story and request as a Chrome trace-event timeline (Perfetto, chrome://tracing)",
+    type=click.Path(dir_okay=False, path_type=Path),
+)
+@click.option(
+    "--replay",
+    help="Verify stories against a recorded trace instead of a server",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+)
+@click.option(
+    "--pipeline",
+    help="Send each story's requests back-to-back, verify them in the background and report every mismatch",
+    is_flag=True,
+)
+@click.option(
+    "--workers",
+    "-w",
+    help="Run stories in this many processes, each bound to its own shard target",
+    type=click.IntRange(min=1),
+    envvar="DINO_TEST_WORKERS",
+)
+@click.option(
+    "--shard-targets",
+    help="Comma separated server base URLs, one per worker (`inproc` starts one park per worker)",
+    envvar="DINO_TEST_SHARD_TARGETS",
+)
+@click.option(
+    "--history/--no-history",
+    help="Save the run results and timings in the history database",
+    default=True,
+    envvar="DINO_TEST_HISTORY",
+)
+@click.option(
+    "--history-db",
+    help="History database (default: ~/.local/share/glo4002-e2e-tester/history.sqlite3)",
+    type=click.Path(dir_okay=False, path_type=Path),
+    envvar="DINO_TEST_HISTORY_DB",
+)
+@click.option(
+    "--server-revision",
+    help="Revision of the server under test saved in the history (default: git revision of the current directory)",
+    envvar="DINO_TEST_SERVER_REVISION",
+)
+@click.option(
+    "--profile",
+    help="Run each story under cProfile, write one .prof file per story in this directory and print where time goes",
+    type=click.Path(file_okay=False, path_type=Path),
+)
+@click.option("--profile-memory", help="Also trace each story's peak memory (slower)", is_flag=True)
+@click.option(
+    "--watch",
+    help="Keep running: rerun changed stories when their files change and every selected story when the server restarts",
+    is_flag=True,
+)
+@click.option(
+    "--watch-interval",
+    help="Seconds between file and heartbeat polls in watch mode",
+    type=click.FloatRange(min=0, min_open=True),
+    default=0.5,
+    show_default=True,
+)
+@click.option("--max-connections", help="Connection pool size", type=int, envvar="DINO_TEST_MAX_CONNECTIONS")
+@click.option(
+    "--max-keepalive",
+    help="Idle keep-alive connections kept in the pool",
+    type=int,
+    envvar="DINO_TEST_MAX_KEEPALIVE",
+)
+@click.option(
+    "--keepalive-expiry",
+    help="Seconds an idle connection is kept",
+    type=float,
+    envvar="DINO_TEST_KEEPALIVE_EXPIRY",
+)
+@click.option("--http2/--no-http2", help="Negotiate HTTP/2", default=False, envvar="DINO_TEST_HTTP2")
+@click.option(
+    "--connect-timeout", help="Connect timeout in seconds", type=float, envvar="DINO_TEST_CONNECT_TIMEOUT"
+)
+@click.option("--read-timeout", help="Read timeout in seconds", type=float, envvar="DINO_TEST_READ_TIMEOUT")
+@click.option(
+    "--step-timeout",
+    help="Seconds a single request may take before its story times out",
+    type=click.FloatRange(min=0, min_open=True),
+    envvar="DINO_TEST_STEP_TIMEOUT",
+)
+@click.option(
+    "--story-timeout",
+    help="Seconds a whole story may take, later requests are cut short once it is spent",
+    type=click.FloatRange(min=0, min_open=True),
+    envvar="DINO_TEST_STORY_TIMEOUT",
+)
+@click.option(
+    "--max-timeouts",
+    help="Skip the remaining stories after this many consecutive timed out stories (0: never)",
+    type=click.IntRange(min=0),
+    default=3,
+    show_default=True,
+    envvar="DINO_TEST_MAX_TIMEOUTS",
+)
+@click.pass_context
+def main(
+    ctx: click.Context,
+    story: Collection[int] | None,
+    list_stories: bool = False,
+    target: Sequence[str] = (),
+    story_file: Collection[Path] = (),
+    generate: int = 0,
+    generate_seed: int = 0,
+    timings: bool = False,
+    record: Path | None = None,
+    trace_out: Path | None = None,
+    replay: Path | None = None,
+    pipeline: bool = False,
+    workers: int | None = None,
+    shard_targets: str | None = None,
+    history: bool = True,
+    history_db: Path | None = None,
+    server_revision: str | None = None,
+    profile: Path | None = None,
+    profile_memory: bool = False,
+    watch: bool = False,
+    watch_interval: float = 0.5,
+    max_connections: int | None = None,
+    max_keepalive: int | None = None,
+    keepalive_expiry: float | None = None,
+    http2: bool = False,
+    connect_timeout: float | None = None,
+    read_timeout: float | None = None,
+    step_timeout: float | None = None,
+    story_timeout: float | None = None,
+    max_timeouts: int = 3,
+) -> None:
+    from .clients import DEFAULT_TARGET, ClientConfig, configure_clients
+    from .resources import set_time_budgets
+
+    try:
+        configure_clients(
+            ClientConfig(
+                target=target[0] if len(target) == 1 else DEFAULT_TARGET,
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+                http2=http2,
+                connect_timeout=connect_timeout,
+                read_timeout=read_timeout,
+            )
+        )
+    except RuntimeError as err:
+        raise click.UsageError(str(err))
+    set_time_budgets(step_timeout, story_timeout)
+    if story_file:
+        from .story_files import StoryFileError, register_story_files
+
+        try:
+            register_story_files(story_file)
+        except StoryFileError as err:
+            raise click.BadParameter(str(err), param_hint="--story-file")
+    if generate:
+        from .combinatorial import register_generated_stories
+        from .tests import DuplicateStoryError
+
+        try:
+            register_generated_stories(generate_seed, generate)
+        except DuplicateStoryError as err:
+            raise click.BadParameter(str(err), param_hint="--generate")
+    if ctx.invoked_subcommand is not None:
+        return
+    from .tests import list_test_stories, run_test_stories, set_max_consecutive_timeouts
+
     if list_stories:
         list_test_stories()
-    else:
-        run_test_stories(story)
+        return
+    from .resources import add_request_observer, set_deferred_verification
+
+    set_deferred_verification(pipeline)
+    set_max_consecutive_timeouts(max_timeouts)
+    if profile is not None and (
+        replay is not None or workers is not None or shard_targets or len(target) > 1
+    ):
+        raise click.UsageError("--profile runs the stories in this process, on a single target")
+    if watch:
+        if (
+            replay is not None
+            or record is not None
+            or trace_out is not None
+            or workers is not None
+            or shard_targets
+            or len(target) > 1
+        ):
+            raise click.UsageError(
+                "--watch runs on a single target, without --replay, --record, --trace-out or workers"
+            )
+        from .watch import watch_test_stories
+
+        watch_test_stories(story, list(story_file), watch_interval)
+        return
+    history = history and replay is None
+    if timings:
+        from .timings import TimingCollector
+
+        collector = TimingCollector()
+        add_request_observer(collector, needs_body=False)
+    if history:
+        from time import time
+
+        from .history import HistoryCollector
+
+        started_at = time()
+        history_collector = HistoryCollector()
+        add_request_observer(history_collector, needs_body=False)
+    if record is not None:
+        from .recording import TraceRecorder
+
+        recorder = TraceRecorder(record)
+        add_request_observer(recorder)
+    if trace_out is not None:
+        from .tests import add_story_observer
+        from .tracing import TraceEventExporter
+
+        exporter = TraceEventExporter(trace_out)
+        add_request_observer(exporter)
+        add_story_observer(exporter.add_story)
+    try:
+        if replay is not None:
+            from .recording import replay_trace
+
+            results = replay_trace(replay)
+        elif workers is not None or shard_targets:
+            from .clients import client_config
+            from .sharding import assign_shard_targets, run_test_stories_on_shards
+
+            try:
+                targets = assign_shard_targets(
+                    shard_targets.split(",") if shard_targets else list(target) or [client_config().target],
+                    workers,
+                )
+            except ValueError as err:
+                raise click.BadParameter(str(err), param_hint="--shard-targets")
+            results = run_test_stories_on_shards(
+                story, targets, pipeline, list(story_file), (generate_seed, generate)
+            )
+        elif profile is not None:
+            from .profiling import print_profile_report, profile_test_stories
+
+            results, profiles, combined = profile_test_stories(story, profile, profile_memory)
+            print_profile_report(profiles, combined)
+        elif len(target) > 1:
+            from .parallel import run_test_stories_on_targets
+
+            results = run_test_stories_on_targets(story, list(target))
+        else:
+            results = run_test_stories(story)
+    finally:
+        if record is not None:
+            recorder.close()
+        if trace_out is not None:
+            exporter.close()
+    if timings:
+        from .timings import print_timing_report
+
+        print_timing_report(collector, results)
+    if history:
+        from .clients import client_config
+        from .history import default_history_path, save_run
+        from .history import server_revision as git_revision
+
+        save_run(
+            history_db or default_history_path(),
+            ",".join(shard_targets.split(",") if shard_targets else target) or client_config().target,
+            server_revision or git_revision(),
+            results,
+            history_collector.steps,
+            started_at,
+        )
+
+
+@main.command()
+@click.option("--story", "-s", help="Story to replay (default: all)", type=int, multiple=True)
+@click.option("--mix", "-m", help="Weighted call mix instead of stories, e.g. turn=5,resources=3")
+@click.option("--users", "-u", help="Concurrent virtual users", type=int, default=10, show_default=True)
+@click.option("--duration", "-d", help="Run for this many seconds", type=float)
+@click.option("--iterations", "-n", help="Stories or calls per virtual user", type=int)
+@click.option("--target", "-t", help="Server base URL or `inproc`, repeatable", multiple=True)
+@click.option(
+    "--rate",
+    "-r",
+    help="Open loop: start mix calls at this constant rate per second, --users bounds the calls in flight",
+    type=click.FloatRange(min=0, min_open=True),
+)
+@click.option("--seed", help="Random seed of the call mix", type=int, default=0, show_default=True)
+@click.option("--save", help="Write mergeable histograms as JSON", type=click.Path(path_type=Path))
+@click.option(
+    "--trace-out",
+    help="Write every story and request as a Chrome trace-event timeline",
+    type=click.Path(dir_okay=False, path_type=Path),
+)
+def load(
+    story: Collection[int],
+    mix: str | None,
+    users: int,
+    duration: float | None,
+    iterations: int | None,
+    target: Collection[str],
+    rate: float | None,
+    seed: int,
+    save: Path | None,
+    trace_out: Path | None,
+) -> None:
+    """Replay stories or a weighted call mix from concurrent virtual users."""
+    import asyncio
+
+    from .clients import client_config
+    from .load import (
+        parse_mix,
+        print_load_report,
+        print_open_loop_report,
+        run_load,
+        run_open_loop,
+        save_load_report,
+    )
+    from .tests import select_test_stories
+
+    if duration is None and iterations is None:
+        raise click.UsageError("Either --duration or --iterations is required")
+    try:
+        weights = parse_mix(mix) if mix else None
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint="--mix")
+    if rate is not None and (duration is None or weights is None):
+        raise click.UsageError("--rate requires --duration and --mix")
+    if trace_out is not None:
+        from .resources import add_request_observer
+        from .tests import add_story_observer
+        from .tracing import TraceEventExporter
+
+        exporter = TraceEventExporter(trace_out)
+        add_request_observer(exporter)
+        add_story_observer(exporter.add_story)
+    try:
+        if rate is not None:
+            assert duration is not None and weights is not None
+            open_loop_report = asyncio.run(
+                run_open_loop(
+                    targets=list(target) or [client_config().target],
+                    rate=rate,
+                    duration=duration,
+                    mix=weights,
+                    concurrency=users,
+                    seed=seed,
+                )
+            )
+            print_open_loop_report(open_loop_report)
+            if save is not None:
+                save_load_report(open_loop_report, save)
+            return
+        report = asyncio.run(
+            run_load(
+                targets=list(target) or [client_config().target],
+                users=users,
+                stories=select_test_stories(story),
+                mix=weights,
+                duration=duration,
+                iterations=iterations,
+                seed=seed,
+            )
+        )
+    finally:
+        if trace_out is not None:
+            exporter.close()
+    print_load_report(report)
+    if save is not None:
+        save_load_report(report, save)
+
+
+@main.command()
+@click.option(
+    "--sizes",
+    help="Comma separated population sizes",
+    default=",".join(str(size) for size in (10, 100, 1000, 10000, 100000)),
+    show_default=True,
+)
+@click.option(
+    "--repeats", "-r", help="Timed calls per endpoint and size", type=int, default=3, show_default=True
+)
+@click.option(
+    "--in-flight",
+    help="Concurrent POST /dinosaurs while seeding",
+    type=click.IntRange(min=1),
+    default=32,
+    show_default=True,
+)
+@click.option(
+    "--max-exponent",
+    help="Fail when latency over the larger half of the sizes grows faster than size ** max-exponent",
+    type=float,
+    default=1.5,
+    show_default=True,
+)
+def scale(sizes: str, repeats: int, in_flight: int, max_exponent: float) -> None:
+    """Time /turn, /dinosaurs and /resources while the population grows and fit their growth exponent."""
+    from .scaling import ScaleError, parse_sizes, print_scale_report, run_scale
+
+    try:
+        population_sizes = parse_sizes(sizes)
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint="--sizes")
+    try:
+        report = run_scale(population_sizes, repeats, in_flight)
+    except ScaleError as err:
+        raise click.ClickException(str(err))
+    print_scale_report(report, max_exponent)
+    too_steep = {
+        endpoint: exponent for endpoint, exponent in report.exponents().items() if exponent > max_exponent
+    }
+    if too_steep:
+        raise click.ClickException(
+            ", ".join(f"{endpoint} grows as size^{exponent:.2f}" for endpoint, exponent in too_steep.items())
+            + f" (max {max_exponent})"
+        )
+
+
+@main.command()
+@click.option(
+    "--scenario",
+    "-s",
+    help="Conflict to provoke (default: all)",
+    type=click.Choice(["duplicate-name", "distinct-names", "resources-vs-turn"]),
+    multiple=True,
+)
+@click.option(
+    "--bursts", "-b", help="Bursts per scenario", type=click.IntRange(min=1), default=10, show_default=True
+)
+@click.option(
+    "--concurrency",
+    "-c",
+    help="Conflicting requests released together in each burst",
+    type=click.IntRange(min=2),
+    default=16,
+    show_default=True,
+)
+def stress(scenario: Sequence[str], bursts: int, concurrency: int) -> None:
+    """Fire bursts of conflicting requests in parallel and check the park's invariants after each one."""
+    from .stress import STRESS_SCENARIOS, print_stress_report, run_stress
+
+    report = run_stress(list(scenario) or list(STRESS_SCENARIOS), bursts, concurrency)
+    print_stress_report(report)
+    if report.violations:
+        raise click.ClickException(f"{len(report.violations)} invariant violations under contention")
+
+
+@main.command("history")
+@click.option(
+    "--history-db",
+    help="History database (default: ~/.local/share/glo4002-e2e-tester/history.sqlite3)",
+    type=click.Path(dir_okay=False, path_type=Path),
+    envvar="DINO_TEST_HISTORY_DB",
+)
+@click.option("--target", "-t", help="Compare the latest run on this target (default: latest run)")
+@click.option(
+    "--baseline", "-b", help="Previous runs in the baseline", type=int, default=10, show_default=True
+)
+@click.option(
+    "--threshold",
+    help="Standard deviations above the baseline mean to flag a regression",
+    type=float,
+    default=3.0,
+    show_default=True,
+)
+@click.option(
+    "--min-increase",
+    help="Ignore increases below this fraction of the baseline mean",
+    type=float,
+    default=0.1,
+    show_default=True,
+)
+def history_command(
+    history_db: Path | None, target: str | None, baseline: int, threshold: float, min_increase: float
+) -> None:
+    """Compare the latest run with the previous ones and fail on latency regressions or newly failing stories."""
+    from .history import default_history_path, find_regressions, print_history_report
+
+    report = find_regressions(history_db or default_history_path(), baseline, threshold, min_increase, target)
+    if report is None:
+        raise click.ClickException("No run in the history")
+    print_history_report(report)
+    if report.regressions or report.newly_failing:
+        raise click.ClickException(
+            f"{len(report.regressions)} latency regressions, {len(report.newly_failing)} newly failing stories"
+        )
+
+
+@main.command("load-merge")
+@click.argument("reports", nargs=-1, required=True, type=click.Path(exists=True, path_type=Path))
+def load_merge(reports: Collection[Path]) -> None:
+    """Combine histograms saved by several `load --save` runs."""
+    from .load import LoadReport, load_load_report, print_load_report
+
+    merged = LoadReport()
+    for report in reports:
+        merged.merge(load_load_report(report))
+    print_load_report(merged)
+
+
+@main.command("load-coordinator")
+@click.option("--story", "-s", help="Story to replay (default: all)", type=int, multiple=True)
+@click.option("--mix", "-m", help="Weighted call mix instead of stories, e.g. turn=5,resources=3")
+@click.option(
+    "--users",
+    "-u",
+    help="Concurrent virtual users, across all workers",
+    type=int,
+    default=10,
+    show_default=True,
+)
+@click.option("--duration", "-d", help="Run for this many seconds", type=float)
+@click.option("--iterations", "-n", help="Stories or calls per virtual user", type=int)
+@click.option("--target", "-t", help="Server base URL or `inproc`, repeatable", multiple=True)
+@click.option("--seed", help="Random seed of the call mix", type=int, default=0, show_default=True)
+@click.option("--save", help="Write the merged histograms as JSON", type=click.Path(path_type=Path))
+@click.option(
+    "--listen",
+    help="Address workers connect to, use 0.0.0.0:PORT to accept workers from other machines",
+    default="127.0.0.1:7400",
+    show_default=True,
+    envvar="DINO_TEST_COORDINATOR",
+)
+@click.option(
+    "--workers", "-w", help="Workers to wait for (default: --local-workers)", type=click.IntRange(min=1)
+)
+@click.option(
+    "--local-workers",
+    help="Start this many worker processes on this machine",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+)
+@click.option(
+    "--wait", help="Seconds to wait for every worker to connect", type=float, default=60.0, show_default=True
+)
+@click.option(
+    "--report-interval",
+    help="Seconds between the histograms workers stream back",
+    type=click.FloatRange(min=0, min_open=True),
+    default=1.0,
+    show_default=True,
+)
+@click.pass_context
+def load_coordinator(
+    ctx: click.Context,
+    story: Collection[int],
+    mix: str | None,
+    users: int,
+    duration: float | None,
+    iterations: int | None,
+    target: Collection[str],
+    seed: int,
+    save: Path | None,
+    listen: str,
+    workers: int | None,
+    local_workers: int,
+    wait: float,
+    report_interval: float,
+) -> None:
+    """Split a load run across workers and merge the latency histograms and outcomes they stream back."""
+    import socket
+
+    from .clients import client_config
+    from .distributed import (
+        Assignment,
+        CoordinationError,
+        parse_address,
+        print_worker_report,
+        run_coordinator,
+        start_local_workers,
+    )
+    from .load import parse_mix, print_load_report, save_load_report
+    from .tests import select_test_stories
+
+    if duration is None and iterations is None:
+        raise click.UsageError("Either --duration or --iterations is required")
+    workers = workers or local_workers
+    if not workers or workers < local_workers:
+        raise click.UsageError("--workers must be at least 1 and --local-workers")
+    if users < workers:
+        raise click.UsageError(f"--users must be at least the {workers} workers")
+    try:
+        weights = parse_mix(mix) if mix else None
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint="--mix")
+    try:
+        address = parse_address(listen)
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint="--listen")
+    assignment = Assignment(
+        targets=list(target) or [client_config().target],
+        users=users,
+        stories=[] if weights else [test_story.__name__ for test_story in select_test_stories(story)],
+        mix=weights,
+        duration=duration,
+        iterations=iterations,
+        seed=seed,
+        report_interval=report_interval,
+    )
+    with socket.create_server(address) as server:
+        host, port = server.getsockname()[:2]
+        processes = start_local_workers(
+            ("127.0.0.1" if host in ("0.0.0.0", "::") else host, port),
+            local_workers,
+            ctx.parent.params["story_file"] if ctx.parent else (),
+            (ctx.parent.params["generate_seed"], ctx.parent.params["generate"]) if ctx.parent else (0, 0),
+            wait,
+        )
+        try:
+            report = run_coordinator(server, workers, assignment, wait)
+        except CoordinationError as err:
+            raise click.ClickException(str(err))
+        finally:
+            for process in processes:
+                process.join(timeout=wait)
+                if process.is_alive():
+                    process.terminate()
+    print_worker_report(report)
+    merged = report.merged()
+    print_load_report(merged)
+    if save is not None:
+        save_load_report(merged, save)
+    if report.errors:
+        raise click.ClickException(f"{len(report.errors)} workers failed: " + "; ".join(report.errors))
+
+
+@main.command("load-worker")
+@click.option(
+    "--coordinator",
+    "-c",
+    help="Address of the load coordinator",
+    default="127.0.0.1:7400",
+    show_default=True,
+    envvar="DINO_TEST_COORDINATOR",
+)
+@click.option(
+    "--wait",
+    help="Seconds to wait for the coordinator to accept",
+    type=float,
+    default=60.0,
+    show_default=True,
+)
+def load_worker(coordinator: str, wait: float) -> None:
+    """Connect to a load coordinator, run the share of virtual users it assigns and stream back the results."""
+    from .distributed import CoordinationError, parse_address, run_worker
+
+    try:
+        address = parse_address(coordinator)
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint="--coordinator")
+    try:
+        run_worker(address, wait)
+    except (CoordinationError, OSError) as err:
+        raise click.ClickException(str(err))
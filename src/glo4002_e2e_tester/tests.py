@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-from collections.abc import Callable, Collection, MutableSequence
-
-from rich import print
+import os
+from collections.abc import Callable, Collection, Iterator, MutableSequence, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass
+from time import perf_counter, time
+from typing import Literal
 
 from .models import (
     DinoGender,
@@ -19,6 +22,7 @@ from .models import (
 )
 from .resources import (
     Status,
+    StepTimeout,
     get_dinosaur_by_name,
     get_dinosaurs,
     get_heartbeat,
@@ -27,11 +31,27 @@ from .resources import (
     post_reset,
     post_resources,
     post_turn,
+    story_deadline,
+    story_time_budget,
+    use_story,
+    verification_scope,
 )
 
 TestStory = Callable[[], None]
+DEFAULT_MAX_CONSECUTIVE_TIMEOUTS = 3
+
+
+class DuplicateStoryError(ValueError):
+    pass
+
 
-_test_stories: MutableSequence[TestStory] = []
+# Kept across `importlib.reload` so that watch mode replaces stories instead of forgetting the other modules' ones
+_test_stories: MutableSequence[TestStory] = globals().get("_test_stories", [])
+_story_indices: dict[tuple[str, str], list[int]] = globals().get("_story_indices", {})
+_story_sources: dict[str, str] = globals().get("_story_sources", {})
+_reloaded: dict[tuple[str, str], int] = globals().get("_reloaded", {})
+_reloading: bool = globals().get("_reloading", False)
+_max_consecutive_timeouts = DEFAULT_MAX_CONSECUTIVE_TIMEOUTS
 
 
 def test_turn_reset_turn() -> None:
@@ -371,20 +391,139 @@ def test_mep2_dino() -> None:
     post_turn(expected_response=PostTurnResponse(turnNumber=3))
 
 
-def run_test_stories(stories: Collection[int] | None) -> None:
-    if stories is None:
-        test_stories_to_run = _test_stories
-    else:
-        test_stories_to_run = [_test_stories[story] for story in stories]
-    print("Run tests")
-    for test_story in test_stories_to_run or _test_stories:
+StoryOutcome = Literal["PASS", "FAIL", "ERROR", "TIMEOUT", "SKIP"]
+
+
+@dataclass(frozen=True)
+class StoryResult:
+    name: str
+    outcome: StoryOutcome
+    message: str = ""
+    duration: float = 0.0
+    budget: float | None = None
+    started_at: float = 0.0
+
+
+StoryObserver = Callable[[StoryResult], None]
+
+_story_observers: list[StoryObserver] = []
+
+
+def add_story_observer(observer: StoryObserver) -> None:
+    _story_observers.append(observer)
+
+
+def remove_story_observer(observer: StoryObserver) -> None:
+    _story_observers.remove(observer)
+
+
+def clear_story_observers() -> None:
+    _story_observers.clear()
+
+
+def notify_story_observers(result: StoryResult) -> None:
+    for observer in _story_observers:
+        observer(result)
+
+
+class ServerHealth:
+    """Counts consecutive timed out stories, the server is unhealthy once they reach the limit (0: never)."""
+
+    def __init__(self, max_timeouts: int | None = None) -> None:
+        self.max_timeouts = _max_consecutive_timeouts if max_timeouts is None else max_timeouts
+        self.consecutive_timeouts = 0
+
+    @property
+    def healthy(self) -> bool:
+        return not self.max_timeouts or self.consecutive_timeouts < self.max_timeouts
+
+    def record(self, result: StoryResult) -> None:
+        if result.outcome == "TIMEOUT":
+            self.consecutive_timeouts += 1
+        elif result.outcome != "SKIP":
+            self.consecutive_timeouts = 0
+
+    def skipped(self, test_story: TestStory) -> StoryResult:
+        return StoryResult(
+            test_story.__name__,
+            "SKIP",
+            f"server unhealthy after {self.consecutive_timeouts} consecutive timeouts",
+        )
+
+
+def set_max_consecutive_timeouts(max_timeouts: int) -> None:
+    global _max_consecutive_timeouts
+    _max_consecutive_timeouts = max_timeouts
+
+
+def registered_test_stories() -> Sequence[TestStory]:
+    return _test_stories
+
+
+def select_test_story_indices(stories: Collection[int] | None) -> list[int]:
+    if stories:
+        return [range(len(_test_stories))[story] for story in stories]
+    return list(range(len(_test_stories)))
+
+
+def select_test_stories(stories: Collection[int] | None) -> Sequence[TestStory]:
+    return [_test_stories[index] for index in select_test_story_indices(stories)]
+
+
+def run_test_story(test_story: TestStory) -> StoryResult:
+    name = test_story.__name__
+    budget = story_time_budget()
+    started_at = time()
+    start = perf_counter()
+    outcome: StoryOutcome
+    with use_story(name), story_deadline():
         try:
-            test_story()
-            print(f" - PASS : {test_story.__name__}")
+            with verification_scope():
+                test_story()
+            outcome, message = "PASS", ""
         except AssertionError as err:
-            print(f" - FAIL : {test_story.__name__} - {err}")
+            outcome, message = "FAIL", str(err)
+        except StepTimeout as err:
+            outcome, message = "TIMEOUT", str(err)
         except Exception as err:
-            print(f" - ERROR: {test_story.__name__} - {err}")
+            outcome, message = "ERROR", str(err)
+    result = StoryResult(name, outcome, message, perf_counter() - start, budget, started_at)
+    notify_story_observers(result)
+    return result
+
+
+def _budget_usage(result: StoryResult) -> str:
+    if result.budget is None:
+        return ""
+    return f" [dim]({result.duration:.2f}s, {result.duration / result.budget:.0%} of {result.budget:g}s budget)[/dim]"
+
+
+def print_story_result(result: StoryResult) -> None:
+    from rich import print
+
+    if result.outcome == "PASS":
+        print(f" - PASS : {result.name}{_budget_usage(result)}")
+    elif result.outcome == "FAIL":
+        print(f" - FAIL : {result.name}{_budget_usage(result)} - {result.message}")
+    elif result.outcome == "TIMEOUT":
+        print(f" - TIME : {result.name}{_budget_usage(result)} - {result.message}")
+    elif result.outcome == "SKIP":
+        print(f" - SKIP : {result.name} - {result.message}")
+    else:
+        print(f" - ERROR: {result.name}{_budget_usage(result)} - {result.message}")
+
+
+def run_test_stories(stories: Collection[int] | None) -> list[StoryResult]:
+    from rich import print
+
+    print("Run tests")
+    results = []
+    health = ServerHealth()
+    for test_story in select_test_stories(stories):
+        results.append(run_test_story(test_story) if health.healthy else health.skipped(test_story))
+        health.record(results[-1])
+        print_story_result(results[-1])
+    return results
 
 
 def list_test_stories() -> None:
@@ -393,8 +532,48 @@ def list_test_stories() -> None:
         print(f" - {i:>2}: {test_story.__name__}")
 
 
-def register_test_story_builder(test_story: TestStory) -> None:
+def _story_source(test_story: TestStory) -> str:
+    code = getattr(test_story, "__code__", None)
+    return test_story.__module__ if code is None else os.path.abspath(code.co_filename)
+
+
+@contextmanager
+def reloading_test_stories() -> Iterator[None]:
+    """Lets stories registered again from the source they came from replace their previous version."""
+    global _reloading
+    _reloaded.clear()
+    _reloading = True
+    try:
+        yield
+    finally:
+        _reloading = False
+
+
+def register_test_story_builder(
+    test_story: TestStory, source: str | None = None, unique: bool = False
+) -> None:
+    """`source` tells apart same-named stories, by default the file defining the story function.
+
+    A reload replaces the stories of a source in the order they were registered. `unique` rejects a name that is
+    already registered, as story files and generated stories must be selectable by name.
+    """
+    name = test_story.__name__
+    source = source or _story_source(test_story)
+    key = (name, source)
+    indices = _story_indices.setdefault(key, [])
+    if _reloading:
+        position = _reloaded.get(key, 0)
+        _reloaded[key] = position + 1
+        if position < len(indices):
+            _test_stories[indices[position]] = test_story
+            return
+    if unique and name in _story_sources:
+        raise DuplicateStoryError(
+            f"Story '{name}' from {source} is already registered from {_story_sources[name]}"
+        )
+    indices.append(len(_test_stories))
     _test_stories.append(test_story)
+    _story_sources.setdefault(name, source)
 
 
 register_test_story_builder(test_turn_reset_turn)
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+
+from rich import print
+from rich.table import Table
+
+from .resources import Exchange
+from .tests import StoryResult
+
+
+@dataclass(frozen=True)
+class EndpointTotals:
+    endpoint: str
+    count: int
+    total: float
+    maximum: float
+    connect: float
+    ttfb: float
+    read: float
+
+
+class TimingCollector:
+    def __init__(self) -> None:
+        self.exchanges: list[Exchange] = []
+
+    def __call__(self, exchange: Exchange) -> None:
+        self.exchanges.append(exchange)
+
+    def endpoint_totals(self) -> list[EndpointTotals]:
+        grouped: defaultdict[str, list[Exchange]] = defaultdict(list)
+        for exchange in self.exchanges:
+            grouped[f"{exchange.method} {exchange.route}"].append(exchange)
+        return [
+            EndpointTotals(
+                endpoint=endpoint,
+                count=len(exchanges),
+                total=sum(exchange.elapsed for exchange in exchanges),
+                maximum=max(exchange.elapsed for exchange in exchanges),
+                connect=sum(exchange.connect or 0.0 for exchange in exchanges),
+                ttfb=sum(exchange.ttfb or 0.0 for exchange in exchanges),
+                read=sum(exchange.read or 0.0 for exchange in exchanges),
+            )
+            for endpoint, exchanges in sorted(grouped.items())
+        ]
+
+    def connections_opened(self) -> int:
+        return sum(1 for exchange in self.exchanges if exchange.connect is not None)
+
+    def http_time_by_story(self) -> dict[str | None, float]:
+        totals: defaultdict[str | None, float] = defaultdict(float)
+        for exchange in self.exchanges:
+            totals[exchange.story] += exchange.elapsed
+        return dict(totals)
+
+
+def _millis(seconds: float | None) -> str:
+    return "-" if seconds is None else f"{seconds * 1000:.2f}"
+
+
+def _table(title: str, columns: Iterable[str]) -> Table:
+    table = Table(title=title)
+    for index, column in enumerate(columns):
+        table.add_column(column, justify="left" if index == 0 else "right")
+    return table
+
+
+def print_connection_reuse(connections: int, requests: int) -> None:
+    reused = f"{(requests - connections) / requests:.1%}" if requests else "-"
+    print(f"{connections} connections opened for {requests} requests ({reused} reused)")
+
+
+def print_timing_report(
+    collector: TimingCollector, results: Sequence[StoryResult] = (), slowest: int = 10
+) -> None:
+    steps = _table(
+        "Slowest steps (ms)", ("Story", "Step", "Endpoint", "Status", "Total", "Connect", "TTFB", "Read")
+    )
+    step_numbers: defaultdict[str | None, int] = defaultdict(int)
+    numbered = []
+    for exchange in collector.exchanges:
+        step_numbers[exchange.story] += 1
+        numbered.append((step_numbers[exchange.story], exchange))
+    for step, exchange in sorted(numbered, key=lambda item: item[1].elapsed, reverse=True)[:slowest]:
+        steps.add_row(
+            exchange.story or "-",
+            str(step),
+            f"{exchange.method} {exchange.route}",
+            str(exchange.status),
+            _millis(exchange.elapsed),
+            _millis(exchange.connect),
+            _millis(exchange.ttfb),
+            _millis(exchange.read),
+        )
+    print(steps)
+
+    endpoints = _table(
+        "Per-endpoint totals (ms)", ("Endpoint", "Count", "Total", "Mean", "Max", "Connect", "TTFB", "Read")
+    )
+    for totals in collector.endpoint_totals():
+        endpoints.add_row(
+            totals.endpoint,
+            str(totals.count),
+            _millis(totals.total),
+            _millis(totals.total / totals.count),
+            _millis(totals.maximum),
+            _millis(totals.connect),
+            _millis(totals.ttfb),
+            _millis(totals.read),
+        )
+    print(endpoints)
+    print_connection_reuse(collector.connections_opened(), len(collector.exchanges))
+
+    if results:
+        stories = _table("Per-story time (ms)", ("Story", "Wall", "HTTP", "Client overhead"))
+        http_time = collector.http_time_by_story()
+        for result in results:
+            http = http_time.get(result.name, 0.0)
+            stories.add_row(
+                result.name, _millis(result.duration), _millis(http), _millis(result.duration - http)
+            )
+        print(stories)
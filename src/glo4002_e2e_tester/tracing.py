@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import heapq
+import json
+from bisect import bisect_right
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from threading import get_ident
+from typing import Any
+
+from .recording import open_trace
+from .resources import Exchange
+from .tests import StoryResult
+
+STORIES_PID = 1
+REQUESTS_PID = 2
+
+
+def _micros(seconds: float) -> int:
+    return round(seconds * 1_000_000)
+
+
+def assign_lanes(spans: Iterable[tuple[float, float]]) -> list[int]:
+    """Lane of each (start, end) span so that spans sharing a lane never overlap, using as few lanes as possible."""
+    ordered = sorted(enumerate(spans), key=lambda item: item[1][0])
+    free: list[tuple[float, int]] = []
+    lanes = [0] * len(ordered)
+    for index, (start, end) in ordered:
+        if free and free[0][0] <= start:
+            lane = heapq.heapreplace(free, (end, free[0][1]))[1]
+        else:
+            lane = len(free)
+            heapq.heappush(free, (end, lane))
+        lanes[index] = lane
+    return lanes
+
+
+class TraceEventExporter:
+    """Buffers a tuple per request and story, the Chrome trace-event JSON is only built by `close`."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        # story, method, route, path, status, started_at, elapsed, request bytes, response bytes, thread
+        self._steps: list[tuple] = []
+        self._stories: list[tuple[StoryResult, int]] = []
+
+    def __call__(self, exchange: Exchange) -> None:
+        self._steps.append(
+            (
+                exchange.story,
+                exchange.method,
+                exchange.route,
+                exchange.path,
+                exchange.status,
+                exchange.started_at,
+                exchange.elapsed,
+                len(exchange.request_content),
+                len(exchange.response_content),
+                get_ident(),
+            )
+        )
+
+    def add_story(self, result: StoryResult) -> None:
+        self._stories.append((result, get_ident()))
+
+    def events(self) -> Iterator[dict[str, Any]]:
+        starts = [result.started_at for result, _ in self._stories] + [step[5] for step in self._steps]
+        if not starts:
+            return
+        origin = min(starts)
+        story_lanes = assign_lanes(
+            (result.started_at, result.started_at + result.duration) for result, _ in self._stories
+        )
+        # Steps belong to the latest run of their story started on the same thread before them
+        runs: defaultdict[tuple[str, int], list[tuple[float, int]]] = defaultdict(list)
+        for (result, thread), lane in zip(self._stories, story_lanes):
+            runs[result.name, thread].append((result.started_at, lane))
+            yield {
+                "name": result.name,
+                "cat": "story",
+                "ph": "X",
+                "ts": _micros(result.started_at - origin),
+                "dur": _micros(result.duration),
+                "pid": STORIES_PID,
+                "tid": lane,
+                "args": {"story": result.name, "outcome": result.outcome, "message": result.message[:200]},
+            }
+        for lanes in runs.values():
+            lanes.sort()
+        unowned = []
+        for step in self._steps:
+            story_runs = runs.get((step[0], step[9]), [])
+            position = bisect_right(story_runs, (step[5], float("inf")))
+            if position:
+                yield self._step_event(step, origin, STORIES_PID, story_runs[position - 1][1])
+            else:
+                unowned.append(step)
+        for step, lane in zip(unowned, assign_lanes((step[5], step[5] + step[6]) for step in unowned)):
+            yield self._step_event(step, origin, REQUESTS_PID, lane)
+        yield {"name": "process_name", "ph": "M", "pid": STORIES_PID, "args": {"name": "Stories"}}
+        yield {
+            "name": "process_name",
+            "ph": "M",
+            "pid": REQUESTS_PID,
+            "args": {"name": "Requests outside stories"},
+        }
+
+    @staticmethod
+    def _step_event(step: tuple, origin: float, pid: int, lane: int) -> dict[str, Any]:
+        story, method, route, path, status, started_at, elapsed, request_bytes, response_bytes, _ = step
+        return {
+            "name": f"{method} {route}",
+            "cat": "http",
+            "ph": "X",
+            "ts": _micros(started_at - origin),
+            "dur": _micros(elapsed),
+            "pid": pid,
+            "tid": lane,
+            "args": {
+                "story": story,
+                "endpoint": f"{method} {route}",
+                "path": path,
+                "status": status,
+                "request_bytes": request_bytes,
+                "response_bytes": response_bytes,
+            },
+        }
+
+    def close(self) -> None:
+        with open_trace(self.path, "w") as file:
+            file.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+            for index, event in enumerate(self.events()):
+                file.write((",\n" if index else "") + json.dumps(event, separators=(",", ":")))
+            file.write("\n]}\n")
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import importlib
+import runpy
+import sys
+from collections.abc import Collection, Hashable, Iterable, Sequence
+from datetime import datetime
+from pathlib import Path
+from time import sleep
+from types import CodeType
+
+from httpx import TransportError
+from rich import print
+
+from .clients import get_client
+from .resources import HEARTBEAT_ENDPOINT, Status
+from .tests import (
+    TestStory,
+    print_story_result,
+    registered_test_stories,
+    reloading_test_stories,
+    run_test_story,
+    select_test_stories,
+)
+
+DEFAULT_WATCH_INTERVAL = 0.5
+
+
+def _code_fingerprint(code: CodeType) -> Hashable:
+    return (
+        code.co_code,
+        code.co_names,
+        tuple(
+            _code_fingerprint(const) if isinstance(const, CodeType) else repr(const)
+            for const in code.co_consts
+        ),
+    )
+
+
+def story_fingerprint(test_story: TestStory) -> Hashable:
+    """Changes when a story's code or captured values (e.g. a story file plan) change, not when it is only reloaded."""
+    code = getattr(test_story, "__code__", None)
+    if code is None:
+        return id(test_story)
+    closure = getattr(test_story, "__closure__", None) or ()
+    return _code_fingerprint(code), tuple(repr(cell.cell_contents) for cell in closure)
+
+
+def _story_modules() -> dict[Path, str]:
+    modules: dict[Path, str] = {}
+    for test_story in registered_test_stories():
+        module = sys.modules.get(test_story.__module__)
+        path = getattr(module, "__file__", None)
+        if path is not None:
+            modules.setdefault(Path(path), test_story.__module__)
+    return modules
+
+
+def _watched_files(story_files: Sequence[Path]) -> dict[Path, str | None]:
+    from .story_files import iter_story_files
+
+    watched: dict[Path, str | None] = dict(_story_modules())
+    watched.update((path, None) for path in iter_story_files(story_files))
+    return watched
+
+
+def _modification_times(paths: Iterable[Path]) -> dict[Path, float]:
+    times = {}
+    for path in paths:
+        try:
+            times[path] = path.stat().st_mtime
+        except OSError:
+            pass
+    return times
+
+
+def _reload(path: Path, module_name: str | None) -> None:
+    with reloading_test_stories():
+        if module_name is None:
+            from .story_files import register_story_files
+
+            register_story_files([path])
+        elif module_name == "__main__" or module_name not in sys.modules:
+            runpy.run_path(str(path), run_name="__watch__")
+        else:
+            importlib.reload(sys.modules[module_name])
+
+
+def _server_up(timeout: float) -> bool:
+    try:
+        return get_client().get(HEARTBEAT_ENDPOINT, timeout=timeout).status_code == Status.OK
+    except TransportError:
+        return False
+
+
+def _run_named_stories(names: Collection[str], reason: str) -> None:
+    print(f"[dim]{datetime.now().isoformat(timespec='seconds')}[/dim] Run tests ({reason})")
+    for test_story in registered_test_stories():
+        if test_story.__name__ in names:
+            print_story_result(run_test_story(test_story))
+
+
+def watch_test_stories(
+    stories: Collection[int] | None,
+    story_files: Sequence[Path] = (),
+    interval: float = DEFAULT_WATCH_INTERVAL,
+) -> None:
+    """Reruns the selected stories when the server (re)starts and the changed ones when their files change."""
+    selected = {test_story.__name__ for test_story in select_test_stories(stories)} if stories else None
+    watched = _watched_files(story_files)
+    times = _modification_times(watched)
+    server_up = _server_up(interval)
+    pending = {test_story.__name__ for test_story in select_test_stories(stories)}
+    reason = "selected"
+    print(f"Watching {len(watched)} files and {get_client().base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            if pending and server_up:
+                _run_named_stories(pending, reason)
+                pending.clear()
+            sleep(interval)
+            watched.update(_watched_files(story_files))
+            current = _modification_times(watched)
+            changed = [path for path, mtime in current.items() if times.get(path) != mtime]
+            times = current
+            if changed:
+                before = {
+                    test_story.__name__: story_fingerprint(test_story)
+                    for test_story in registered_test_stories()
+                }
+                for path in changed:
+                    try:
+                        _reload(path, watched[path])
+                    except Exception as err:
+                        print(f"[red]Cannot reload {path}: {type(err).__name__}: {err}[/red]")
+                pending.update(
+                    test_story.__name__
+                    for test_story in registered_test_stories()
+                    if (selected is None or test_story.__name__ in selected)
+                    and before.get(test_story.__name__) != story_fingerprint(test_story)
+                )
+                reason = "changed"
+            up = _server_up(interval)
+            if up and not server_up:
+                print("Server is up")
+                pending.update(test_story.__name__ for test_story in select_test_stories(stories))
+                reason = "server restarted"
+            elif server_up and not up:
+                print("[yellow]Server is down, waiting for its heartbeat[/yellow]")
+            server_up = up
+    except KeyboardInterrupt:
+        pass